@@ -3,10 +3,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
 
-from app.routes import products, admin, auth
-
+# Services read their settings at import time, so .env must be loaded first.
 load_dotenv()
 
+from app.routes import products, admin, auth
+from app.services.ai_service import ai_service
+from app.services.thumbnail_service import thumbnail_service
+from app.services.image_hash_index import image_hash_index
+from app.services.write_buffer import write_buffer
+from app.middleware.admission import admission_controller
+
 app = FastAPI(
     title="Product Listing Platform API",
     description="AI-powered product listing platform with Firebase integration",
@@ -28,6 +34,20 @@ app.include_router(products.router)
 app.include_router(admin.router)
 
 
+@app.on_event("startup")
+async def startup():
+    thumbnail_service.start()
+    write_buffer.start()
+    image_hash_index.rebuild_in_background()
+    thumbnail_service.backfill_in_background()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    write_buffer.stop()
+    thumbnail_service.stop()
+
+
 @app.get("/")
 async def root():
     return {
@@ -43,6 +63,14 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "ai_service": ai_service.metrics(),
+        "admission": admission_controller.snapshot()
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,225 @@
+from fastapi import Depends, HTTPException
+from typing import Dict, Optional
+import math
+import os
+import threading
+import time
+
+from app.middleware.auth import get_current_user
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursting up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_consume(self, tokens: float = 1.0) -> float:
+        """
+        Take `tokens` from the bucket if available.
+        Returns 0 on success, otherwise the number of seconds until enough
+        tokens will have been refilled.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+
+            if self.rate <= 0:
+                return math.inf
+            return (tokens - self._tokens) / self.rate
+
+    def refund(self, tokens: float = 1.0):
+        """Return tokens taken for a request that was not served after all."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def is_full(self) -> bool:
+        with self._lock:
+            elapsed = time.monotonic() - self._updated
+            return self._tokens + elapsed * self.rate >= self.capacity
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit driven by observed latency.
+
+    Every request that completes under the latency target nudges the limit up
+    by 1/limit (so roughly +1 per window of `limit` requests); a request that
+    is slower than the target, or fails, multiplies the limit by `backoff`.
+    Requests beyond the current limit are rejected immediately rather than
+    queued, so callers can be told to retry later.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        target_latency: float,
+        backoff: float = 0.9
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._avg_latency = target_latency
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._in_flight >= int(self._limit):
+                self._rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, latency: float, success: bool = True):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+
+            if not success or latency > self.target_latency:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+            else:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+
+    def retry_after(self) -> int:
+        """Rough estimate of how long until a slot frees up, in whole seconds."""
+        with self._lock:
+            return max(1, math.ceil(self._avg_latency))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "avg_latency_ms": round(self._avg_latency * 1000, 1),
+                "rejected": self._rejected
+            }
+
+
+class AdmissionController:
+    """
+    Per-route concurrency limiter plus per-user token-bucket quotas.
+
+    Routes opt in with `Depends(admission_controller.limit("<route>"))`.
+    Quota violations answer 429 and saturation answers 503, both with a
+    Retry-After header, so expensive routes shed load instead of piling up
+    behind the upstream and starving cheap ones.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AdmissionController, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self._limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+            self._buckets: Dict[str, TokenBucket] = {}
+            self._lock = threading.Lock()
+            self._initialized = True
+
+    @staticmethod
+    def _route_env(route: str, name: str, default: str) -> str:
+        key = f"ADMISSION_{route.upper().replace('-', '_')}_{name}"
+        return os.getenv(key, os.getenv(f"ADMISSION_{name}", default))
+
+    def _get_limiter(self, route: str) -> AdaptiveConcurrencyLimiter:
+        with self._lock:
+            limiter = self._limiters.get(route)
+            if limiter is None:
+                max_limit = int(self._route_env(route, "MAX_CONCURRENCY", "16"))
+                limiter = AdaptiveConcurrencyLimiter(
+                    initial_limit=int(self._route_env(route, "INITIAL_CONCURRENCY", str(max_limit // 2 or 1))),
+                    min_limit=int(self._route_env(route, "MIN_CONCURRENCY", "1")),
+                    max_limit=max_limit,
+                    target_latency=float(self._route_env(route, "TARGET_LATENCY_MS", "15000")) / 1000
+                )
+                self._limiters[route] = limiter
+            return limiter
+
+    def _get_bucket(self, route: str, uid: str) -> Optional[TokenBucket]:
+        per_minute = float(self._route_env(route, "USER_RATE_PER_MIN", "10"))
+        if per_minute <= 0:
+            return None
+
+        key = f"{route}:{uid}"
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) > 10000:
+                    self._buckets = {k: b for k, b in self._buckets.items() if not b.is_full()}
+                bucket = TokenBucket(
+                    rate=per_minute / 60,
+                    capacity=float(self._route_env(route, "USER_BURST", "3"))
+                )
+                self._buckets[key] = bucket
+            return bucket
+
+    def limit(self, route: str):
+        """Build a FastAPI dependency that admits or sheds requests for `route`."""
+
+        async def dependency(current_user: dict = Depends(get_current_user)):
+            bucket = self._get_bucket(route, current_user['uid'])
+            if bucket is not None:
+                wait = bucket.try_consume()
+                if wait > 0:
+                    raise HTTPException(
+                        status_code=429,
+                        detail="Rate limit exceeded for this endpoint",
+                        headers={"Retry-After": str(max(1, math.ceil(min(wait, 3600))))}
+                    )
+
+            limiter = self._get_limiter(route)
+            if not limiter.try_acquire():
+                # Shed for saturation, not quota: don't charge the user for it.
+                if bucket is not None:
+                    bucket.refund()
+                raise HTTPException(
+                    status_code=503,
+                    detail="Service is busy, please retry shortly",
+                    headers={"Retry-After": str(limiter.retry_after())}
+                )
+
+            started = time.monotonic()
+            success = True
+            try:
+                yield current_user
+            except HTTPException as e:
+                success = e.status_code < 500
+                raise
+            except Exception:
+                success = False
+                raise
+            finally:
+                limiter.release(time.monotonic() - started, success)
+
+        return dependency
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {route: limiter.snapshot() for route, limiter in limiters.items()}
+
+
+admission_controller = AdmissionController()
@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 import os
-from app.schemas.product import ProductResponse, ProductStatusUpdate
+from app.schemas.product import (
+    ProductPartialResponse, ProductStatusUpdate, ReviewQueueClaimResponse,
+    parse_product_fields, shape_product
+)
 from app.schemas.user import SetAdminRequest
 from app.services.firebase_service import firebase_service
+from app.services.image_hash_index import image_hash_index
 from app.middleware.auth import require_admin
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
+REVIEW_LEASE_SECONDS = int(os.getenv("REVIEW_LEASE_SECONDS", "300"))
+
 
 @router.post("/set-admin-role", response_model=dict)
 async def set_admin_role(request: SetAdminRequest):
@@ -97,18 +103,29 @@ async def revoke_admin_role(request: SetAdminRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/products", response_model=List[ProductResponse])
+@router.get(
+    "/products",
+    response_model=List[ProductPartialResponse],
+    response_model_exclude_unset=True
+)
 async def get_all_products(
     status: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: dict = Depends(require_admin)
 ):
     """
     Get all products (admin only).
     Optionally filter by status: pending, approved, rejected.
+    Pass `fields=title,status,thumbnail_url` to fetch only those fields.
     """
     try:
-        products = firebase_service.get_all_products(status=status)
-        return products
+        projection = parse_product_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        products = firebase_service.get_all_products(status=status, fields=projection)
+        return [shape_product(product, projection) for product in products]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -124,18 +141,23 @@ async def update_product_status(
     Status can be: pending, approved, rejected.
     """
     try:
-        product = firebase_service.get_product(product_id)
+        product, applied = firebase_service.decide_product_status(
+            product_id,
+            status_update.status.value,
+            current_user['uid']
+        )
         
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        success = firebase_service.update_product_status(
-            product_id, 
-            status_update.status.value
-        )
+        if not applied:
+            raise HTTPException(status_code=409, detail="Product is leased to another moderator")
         
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to update product status")
+        # Rejected listings stop counting as duplicates; un-rejecting brings them back.
+        if status_update.status.value == 'rejected':
+            image_hash_index.discard(product_id)
+        elif product.get('image_hash') and not product.get('is_deleted', False):
+            image_hash_index.add(product_id, product.get('user_id'), product['image_hash'])
         
         return {
             "message": f"Product status updated to {status_update.status.value}",
@@ -146,3 +168,33 @@ async def update_product_status(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/review-queue/claim", response_model=ReviewQueueClaimResponse)
+async def claim_review_queue(
+    n: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    Lease the next `n` pending products (oldest first) to the calling moderator.
+    Leases expire after REVIEW_LEASE_SECONDS and are released when a status is set,
+    so concurrent moderators work on disjoint items.
+    """
+    try:
+        return firebase_service.claim_review_leases(
+            current_user['uid'], n, REVIEW_LEASE_SECONDS
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/review-queue/release", response_model=dict)
+async def release_review_queue(current_user: dict = Depends(require_admin)):
+    """
+    Release every lease held by the calling moderator.
+    """
+    try:
+        released = firebase_service.release_review_leases(current_user['uid'])
+        return {"message": f"Released {released} leased products", "released": released}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,24 +1,169 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional, Tuple
+from datetime import timedelta
+import base64
+import os
 from app.schemas.product import (
-    ProductCreate, ProductUpdate, ProductResponse, 
-    AIGenerationRequest, AIGenerationResponse
+    ProductCreate, ProductUpdate, ProductPartialResponse, ProductSummary,
+    ProductBatchGetRequest, ProductBatchGetResponse, AIGenerationRequest,
+    AIGenerationResponse, parse_product_fields, shape_product
 )
 from app.services.firebase_service import firebase_service
-from app.services.ai_service import ai_service
+from app.services.ai_service import ai_service, AIServiceError, AIServiceUnavailable
+from app.services.thumbnail_service import thumbnail_service
+from app.services.image_hash_index import image_hash_index
+from app.services.idempotency import idempotency_store
+from app.services.write_buffer import write_buffer
 from app.middleware.auth import get_current_user
+from app.middleware.admission import admission_controller
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+STORAGE_IMAGE_MODE = os.getenv("AI_STORAGE_IMAGE_MODE", "signed_url")
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+
+
+def _storage_image_source(storage_path: str, user_id: str) -> Tuple[str, Optional[str]]:
+    """
+    Turn an uploaded Storage object owned by `user_id` into something the vision
+    model can read: a short-lived signed URL, or (AI_STORAGE_IMAGE_MODE=bytes)
+    a data URL streamed from the bucket. Returns (source, image_hash). The
+    object (at most 5 MB, read from inside GCP) is hashed in both modes, since
+    a hash match lets the route skip the far more expensive vision call.
+    """
+    parts = storage_path.split('/')
+    if (
+        len(parts) < 3 or parts[0] != 'products' or parts[1] != user_id or
+        any(part in ('', '.', '..') for part in parts)
+    ):
+        raise HTTPException(status_code=403, detail="Image must be under your products/ folder")
+    
+    blob = firebase_service.bucket.get_blob(storage_path)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    if not (blob.content_type or '').startswith('image/'):
+        raise HTTPException(status_code=400, detail="Object is not an image")
+    
+    if blob.size and blob.size > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=400, detail="Image is larger than 5 MB")
+    
+    image_bytes = blob.download_as_bytes()
+    image_hash = image_hash_index.hash_image(image_bytes)
+    
+    if STORAGE_IMAGE_MODE == "bytes":
+        data = base64.b64encode(image_bytes).decode()
+        return f"data:{blob.content_type};base64,{data}", image_hash
+    
+    signed_url = blob.generate_signed_url(version="v4", expiration=timedelta(minutes=10), method="GET")
+    return signed_url, image_hash
+
+
+def _inline_image_hash(image_data: str) -> Optional[str]:
+    """Decode a base64 / data URL image and hash it; run off the event loop."""
+    try:
+        image_bytes = base64.b64decode(image_data.split(',')[-1])
+    except ValueError:
+        return None
+    return image_hash_index.hash_image(image_bytes) if image_bytes else None
+
+
+def _is_valid_document_id(product_id: str) -> bool:
+    """
+    Firestore document id rules: non-empty, at most 1500 bytes, no '/', not
+    '.' or '..', and not of the reserved form `__.*__`. One invalid id in a
+    `get_all` fails the whole call.
+    """
+    return (
+        bool(product_id) and
+        len(product_id.encode('utf-8')) <= 1500 and
+        '/' not in product_id and
+        product_id not in ('.', '..') and
+        not (product_id.startswith('__') and product_id.endswith('__'))
+    )
+
+
+def _reuse_ai_output(image_hash: Optional[str], user_id: str) -> Optional[dict]:
+    """AI output of the caller's own near-identical listing, if one exists."""
+    if not image_hash:
+        return None
+    
+    for product_id in image_hash_index.find(image_hash, user_id=user_id, limit=3):
+        product = firebase_service.get_product(
+            product_id, fields=['title', 'description', 'keywords', 'user_id', 'is_deleted']
+        )
+        if product and product.get('user_id') == user_id and not product.get('is_deleted'):
+            return {
+                "title": product['title'],
+                "description": product['description'],
+                "keywords": product.get('keywords'),
+                "image_hash": image_hash,
+                "reused_from": product_id
+            }
+    return None
+
+
+def _begin_idempotent(
+    idempotency_key: Optional[str],
+    user_id: str,
+    method: str,
+    path: str,
+    payload: dict,
+    response: Response
+) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Returns (scope, replayed_body). `scope` is None when no key was sent;
+    a replayed body means the request already succeeded and must not run again.
+    """
+    if not idempotency_key:
+        return None, None
+    
+    scope = idempotency_store.scope(user_id, method, path, idempotency_key)
+    state, body = idempotency_store.begin(scope, idempotency_store.fingerprint(payload))
+    
+    if state == idempotency_store.MISMATCH:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    if state == idempotency_store.IN_PROGRESS:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+    if state == idempotency_store.REPLAY:
+        response.headers["Idempotent-Replayed"] = "true"
+        return scope, body
+    return scope, None
+
 
 @router.post("/generate-ai-description", response_model=AIGenerationResponse)
 async def generate_ai_description(
     request: AIGenerationRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(admission_controller.limit("ai-description"))
 ):
     try:
-        result = ai_service.generate_product_description(request.image_data)
-        return AIGenerationResponse(**result)
+        if request.storage_path:
+            image_data, image_hash = await run_in_threadpool(
+                _storage_image_source, request.storage_path, current_user['uid']
+            )
+        else:
+            image_data = request.image_data
+            image_hash = await run_in_threadpool(_inline_image_hash, image_data)
+        
+        reused = await run_in_threadpool(_reuse_ai_output, image_hash, current_user['uid'])
+        if reused:
+            return AIGenerationResponse(**reused)
+        
+        result = await run_in_threadpool(
+            ai_service.generate_product_description, image_data, current_user['uid']
+        )
+        return AIGenerationResponse(**result, image_hash=image_hash)
+    except AIServiceUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except AIServiceError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -26,48 +171,159 @@ async def generate_ai_description(
 @router.post("/", response_model=dict)
 async def create_product(
     product: ProductCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     current_user: dict = Depends(get_current_user)
 ):
+    scope, replay = _begin_idempotent(
+        idempotency_key, current_user['uid'], "POST", "/products/", product.model_dump(), response
+    )
+    if replay is not None:
+        return replay
+    
     try:
         product_data = product.model_dump()
         product_data['user_id'] = current_user['uid']
         product_data['status'] = 'pending'
         
+        if product_data.get('image_hash'):
+            # Client-reported hash; the thumbnail job re-checks it against the stored image.
+            product_data['duplicate_of'] = image_hash_index.find_live(product_data['image_hash'])
+        else:
+            product_data.pop('image_hash', None)
+        
         product_id = firebase_service.create_product(product_data)
+        if product_data.get('image_hash'):
+            image_hash_index.add(product_id, current_user['uid'], product_data['image_hash'])
+        thumbnail_service.enqueue(product_id, current_user['uid'], product_data['image_url'])
         
-        return {
+        result = {
             "id": product_id,
             "message": "Product created successfully",
             "status": "pending"
         }
+        idempotency_store.complete(scope, result)
+        return result
+    except Exception as e:
+        idempotency_store.abandon(scope)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get(
+    "/my-products",
+    response_model=List[ProductPartialResponse],
+    response_model_exclude_unset=True
+)
+async def get_my_products(
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get the caller's products.
+    Pass `fields=title,status,thumbnail_url` to fetch only those fields.
+    """
+    try:
+        projection = parse_product_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        products = firebase_service.get_products_by_user(current_user['uid'], fields=projection)
+        return [shape_product(product, projection) for product in products]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/my-products", response_model=List[ProductResponse])
-async def get_my_products(current_user: dict = Depends(get_current_user)):
+@router.get("/my-products/summary", response_model=List[ProductSummary])
+async def get_my_product_summary(current_user: dict = Depends(get_current_user)):
+    """
+    Lightweight dashboard listing (title, status, thumbnail, timestamps)
+    served from the per-user summary subcollection.
+    """
     try:
-        products = firebase_service.get_products_by_user(current_user['uid'])
-        return products
+        return firebase_service.get_user_product_summary(current_user['uid'])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/{product_id}", response_model=ProductResponse)
+@router.post(
+    ":batchGet",
+    response_model=ProductBatchGetResponse,
+    response_model_exclude_unset=True
+)
+async def batch_get_products(
+    request: ProductBatchGetRequest,
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Fetch up to 300 products by id in a single Firestore read.
+    Ids that do not exist are listed in `missing`, ids the caller may not
+    read in `forbidden`.
+    """
+    try:
+        projection = parse_product_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        ids = list(dict.fromkeys(request.ids))
+        # Ids Firestore would reject cannot exist, so they skip the read and land in `missing`.
+        valid_ids = [product_id for product_id in ids if _is_valid_document_id(product_id)]
+        read_fields = list(dict.fromkeys([*projection, 'user_id'])) if projection is not None else None
+        
+        found = firebase_service.get_products(valid_ids, fields=read_fields) if valid_ids else {}
+        
+        products, missing, forbidden = [], [], []
+        for product_id in ids:
+            product = found.get(product_id)
+            if not product:
+                missing.append(product_id)
+            elif product.get('user_id') != current_user['uid'] and not current_user.get('is_admin'):
+                forbidden.append(product_id)
+            else:
+                products.append(shape_product(product, projection))
+        
+        return {"products": products, "missing": missing, "forbidden": forbidden}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get(
+    "/{product_id}",
+    response_model=ProductPartialResponse,
+    response_model_exclude_unset=True
+)
 async def get_product(
     product_id: str,
+    fields: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        product = firebase_service.get_product(product_id)
+        projection = parse_product_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        # user_id is always needed for the access check.
+        read_fields = list(dict.fromkeys([*projection, 'user_id'])) if projection is not None else None
+        product = firebase_service.get_product(product_id, fields=read_fields)
         
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        if product['user_id'] != current_user['uid'] and not current_user.get('is_admin'):
+        if product.get('user_id') != current_user['uid'] and not current_user.get('is_admin'):
             raise HTTPException(status_code=403, detail="Access denied")
         
-        return product
+        # Read-your-writes for updates still sitting in the write-behind buffer.
+        buffered = write_buffer.pending(product_id)
+        if buffered:
+            product.update({
+                key: value for key, value in buffered.items()
+                if projection is None or key in projection
+            })
+        
+        return shape_product(product, projection)
     except HTTPException:
         raise
     except Exception as e:
@@ -78,8 +334,17 @@ async def get_product(
 async def update_product(
     product_id: str,
     product_update: ProductUpdate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     current_user: dict = Depends(get_current_user)
 ):
+    scope, replay = _begin_idempotent(
+        idempotency_key, current_user['uid'], "PATCH", f"/products/{product_id}",
+        product_update.model_dump(exclude_unset=True), response
+    )
+    if replay is not None:
+        return replay
+    
     try:
         product = firebase_service.get_product(product_id)
         
@@ -94,15 +359,24 @@ async def update_product(
         if not update_data:
             raise HTTPException(status_code=400, detail="No update data provided")
         
-        success = firebase_service.update_product(product_id, update_data)
+        if write_buffer.enabled:
+            write_buffer.submit(product_id, update_data)
+            result = {"message": "Product update accepted", "buffered": True}
+        else:
+            success = firebase_service.update_product(product_id, update_data)
+            
+            if not success:
+                raise HTTPException(status_code=500, detail="Failed to update product")
+            
+            result = {"message": "Product updated successfully"}
         
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to update product")
-        
-        return {"message": "Product updated successfully"}
+        idempotency_store.complete(scope, result)
+        return result
     except HTTPException:
+        idempotency_store.abandon(scope)
         raise
     except Exception as e:
+        idempotency_store.abandon(scope)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -125,6 +399,8 @@ async def delete_product(
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete product")
         
+        image_hash_index.discard(product_id)
+        
         return {"message": "Product deleted successfully"}
     except HTTPException:
         raise
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -16,6 +16,7 @@ class ProductCreate(BaseModel):
     keywords: Optional[List[str]] = None
     image_url: str
     user_id: str
+    image_hash: Optional[str] = Field(None, pattern=r'^[0-9a-f]{16}$')
 
 
 class ProductUpdate(BaseModel):
@@ -39,13 +40,100 @@ class ProductResponse(BaseModel):
     created_at: str
     updated_at: str
     is_deleted: bool = False
+    thumbnail_url: Optional[str] = None
+    image_variants: Optional[Dict[str, str]] = None
+    image_hash: Optional[str] = None
+    duplicate_of: Optional[List[str]] = None
+
+
+class ReviewLeaseProduct(ProductResponse):
+    lease_owner: str
+    lease_expires_at: str
+
+
+class ReviewQueueClaimResponse(BaseModel):
+    lease_expires_at: str
+    products: List[ReviewLeaseProduct]
+
+
+class ProductPartialResponse(BaseModel):
+    """ProductResponse with every field optional, for `fields=` sparse reads."""
+    id: Optional[str] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    keywords: Optional[List[str]] = None
+    image_url: Optional[str] = None
+    user_id: Optional[str] = None
+    status: Optional[ProductStatus] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    is_deleted: Optional[bool] = None
+    thumbnail_url: Optional[str] = None
+    image_variants: Optional[Dict[str, str]] = None
+    image_hash: Optional[str] = None
+    duplicate_of: Optional[List[str]] = None
+
+
+def parse_product_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated `fields=` value into stored field names.
+    Returns None when no projection was requested. `id` is always returned
+    and is not a stored field, so it is dropped from the list.
+    """
+    if not fields:
+        return None
+    
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+    unknown = [f for f in requested if f not in ProductResponse.model_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    
+    return [f for f in requested if f != 'id']
+
+
+def shape_product(product: Dict, fields: Optional[List[str]]) -> Dict:
+    """Full, validated product when `fields` is None, otherwise only the requested keys."""
+    if fields is None:
+        return ProductResponse.model_validate(product).model_dump()
+    return {key: product[key] for key in ['id', *fields] if key in product}
+
+
+class ProductBatchGetRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=300)
+
+
+class ProductBatchGetResponse(BaseModel):
+    products: List[ProductPartialResponse]
+    missing: List[str]
+    forbidden: List[str]
+
+
+class ProductSummary(BaseModel):
+    id: str
+    title: str
+    status: ProductStatus
+    thumbnail_url: Optional[str] = None
+    created_at: str
+    updated_at: str
 
 
 class AIGenerationRequest(BaseModel):
-    image_data: str
+    image_data: Optional[str] = None
+    storage_path: Optional[str] = None
+    
+    @model_validator(mode='after')
+    def check_single_source(self):
+        if bool(self.image_data) == bool(self.storage_path):
+            raise ValueError("Provide exactly one of image_data or storage_path")
+        if self.image_data and self.image_data.startswith(('http://', 'https://')):
+            raise ValueError("image_data must be a base64 image; use storage_path for uploaded files")
+        return self
     
 
 class AIGenerationResponse(BaseModel):
     title: str
     description: str
     keywords: Optional[List[str]] = None
+    degraded: bool = False
+    image_hash: Optional[str] = None
+    reused_from: Optional[str] = None
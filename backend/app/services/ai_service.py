@@ -1,103 +1,469 @@
 import os
 import base64
-from openai import OpenAI
-from typing import Dict, Optional, List
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from io import BytesIO
+from openai import (
+    OpenAI, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+)
+from typing import Any, Callable, Dict, Optional, List, Tuple
+from PIL import Image
+
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.firebase_service import firebase_service
+
+
+RETRYABLE_ERRORS = (
+    APIConnectionError, APITimeoutError, RateLimitError, InternalServerError, TimeoutError
+)
+
+PROMPTS = {
+    "text": """Analyze this product image and provide:
+1. A concise, compelling product title (5-10 words)
+2. A detailed product description (2-3 sentences)
+3. 3-5 relevant keywords for categorization
+
+Format your response as:
+TITLE: [product title]
+DESCRIPTION: [detailed description]
+KEYWORDS: [keyword1, keyword2, keyword3]""",
+    "json": "Describe the product for a marketplace listing: a 5-10 word title, "
+            "a 2-3 sentence description, and 3-5 category keywords.",
+}
+
+PRODUCT_LISTING_SCHEMA = {
+    "name": "product_listing",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "description": {"type": "string"},
+            "keywords": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["title", "description", "keywords"],
+        "additionalProperties": False
+    }
+}
+
+
+def estimate_image_tokens(width: Optional[int], height: Optional[int], detail: str) -> Optional[int]:
+    """
+    Vision input tokens per OpenAI's published tiling rule: 85 for low detail,
+    otherwise 85 + 170 per 512px tile after scaling to fit 2048px and then to
+    768px on the short side. `auto` is costed as high, i.e. an upper bound.
+    """
+    if detail == "low":
+        return 85
+    if not width or not height:
+        return None
+
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+class AIServiceError(Exception):
+    """The vision call failed for a reason retrying will not fix."""
+
+
+class AIServiceUnavailable(AIServiceError):
+    """The vision call failed after retries; the caller should try again later."""
+
+    def __init__(self, message: str, retry_after: int = 30):
+        super().__init__(message)
+        self.retry_after = retry_after
 
 
 class AIService:
     _instance = None
     _initialized = False
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(AIService, cls).__new__(cls)
         return cls._instance
-    
+
     def __init__(self):
         if not self._initialized:
             self._client = None
+            self.model = os.getenv("AI_MODEL", "gpt-4o")
+            self.fallback_model = os.getenv("AI_FALLBACK_MODEL", "")
+            self.attempt_timeout = float(os.getenv("AI_TIMEOUT_SECONDS", "30"))
+            self.deadline = float(os.getenv("AI_DEADLINE_SECONDS", "60"))
+            self.max_retries = int(os.getenv("AI_MAX_RETRIES", "2"))
+            self.retry_base_delay = float(os.getenv("AI_RETRY_BASE_DELAY_SECONDS", "0.5"))
+            self.hedge_percentile = float(os.getenv("AI_HEDGE_PERCENTILE", "0"))
+            self.output_mode = os.getenv("AI_OUTPUT_MODE", "json")
+            self.image_detail = os.getenv("AI_IMAGE_DETAIL", "low")
+            self.max_tokens = int(os.getenv("AI_MAX_TOKENS", "300"))
+            self._breaker = CircuitBreaker(
+                failure_threshold=int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+            )
+            # Room for every call admission lets through plus one hedge each.
+            max_concurrency = os.getenv(
+                "ADMISSION_AI_DESCRIPTION_MAX_CONCURRENCY", os.getenv("ADMISSION_MAX_CONCURRENCY", "16")
+            )
+            self.hedge_workers = int(os.getenv("AI_HEDGE_WORKERS", str(2 * int(max_concurrency))))
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.hedge_workers,
+                thread_name_prefix="ai-hedge"
+            )
+            self._executor_in_flight = 0
+            self._latencies = deque(maxlen=200)
+            self._counters = {
+                "calls": 0,
+                "successes": 0,
+                "failures": 0,
+                "retries": 0,
+                "hedged_requests": 0,
+                "fallbacks": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0
+            }
+            self._metrics_lock = threading.Lock()
             self._initialized = True
-    
+
     @property
     def client(self):
         if self._client is None:
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key or api_key == "placeholder_will_be_set_by_user":
                 raise ValueError("OPENAI_API_KEY environment variable is not set or is still a placeholder. Please set a valid OpenAI API key.")
-            self._client = OpenAI(api_key=api_key)
+            # Retries are handled here so they share one deadline and feed the breaker.
+            self._client = OpenAI(api_key=api_key, timeout=self.attempt_timeout, max_retries=0)
         return self._client
-    
-    def generate_product_description(self, image_data: str) -> Dict[str, any]:
+
+    def _count(self, name: str, amount: int = 1):
+        with self._metrics_lock:
+            self._counters[name] += amount
+
+    def _percentile(self, percentile: float) -> Optional[float]:
+        with self._metrics_lock:
+            samples = sorted(self._latencies)
+        if len(samples) < 20:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index]
+
+    def _submit(self, request_fn: Callable[[float], Any], timeout: float) -> Optional[Future]:
+        """Run `request_fn` on the hedge pool, or return None if it would have to queue."""
+        with self._metrics_lock:
+            if self._executor_in_flight >= self.hedge_workers:
+                return None
+            self._executor_in_flight += 1
+
+        future = self._executor.submit(request_fn, timeout)
+        future.add_done_callback(self._release_worker)
+        return future
+
+    def _release_worker(self, future: Future):
+        with self._metrics_lock:
+            self._executor_in_flight -= 1
+
+    def _hedged_call(self, request_fn: Callable[[float], Any], timeout: float) -> Any:
+        """
+        Run `request_fn`, and if it has not answered by the configured latency
+        percentile, fire a second identical request and take whichever wins.
+        Hedging is skipped while the pool is saturated, and the losing copy is
+        cancelled (a copy already running is bounded by its own timeout).
+        """
+        hedge_delay = self._percentile(self.hedge_percentile) if self.hedge_percentile > 0 else None
+        if hedge_delay is None or hedge_delay >= timeout:
+            return request_fn(timeout)
+
+        deadline = time.monotonic() + timeout
+        primary = self._submit(request_fn, timeout)
+        if primary is None:
+            return request_fn(timeout)
+
+        pending = {primary}
         try:
-            image_format = "jpeg"
-            if image_data.startswith('data:image'):
-                format_match = image_data.split(';')[0].split('/')
-                if len(format_match) > 1:
-                    image_format = format_match[1]
-                image_data = image_data.split(',')[1]
-            
-            prompt = """Analyze this product image and provide:
-1. A concise, compelling product title (5-10 words)
-2. A detailed product description (2-3 sentences)
-3. 3-5 relevant keywords for categorization
+            done, pending = wait(pending, timeout=hedge_delay)
 
-Format your response as:
-TITLE: [product title]
-DESCRIPTION: [detailed description]
-KEYWORDS: [keyword1, keyword2, keyword3]"""
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
+            if not done:
+                hedge = self._submit(request_fn, deadline - time.monotonic())
+                if hedge is not None:
+                    self._count("hedged_requests")
+                    pending.add(hedge)
+
+            error = None
+            while done or pending:
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+                if not pending:
+                    break
+                done, pending = wait(
+                    pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    raise TimeoutError("AI request timed out")
+
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _call_with_retries(self, request_fn: Callable[[float], Any], max_retries: int) -> Any:
+        deadline = time.monotonic() + self.deadline
+        last_error = None
+
+        for attempt in range(max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            started = time.monotonic()
+            try:
+                response = self._hedged_call(request_fn, min(self.attempt_timeout, remaining))
+                with self._metrics_lock:
+                    self._latencies.append(time.monotonic() - started)
+                return response
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+                if attempt == max_retries:
+                    break
+                self._count("retries")
+                # Full jitter keeps a fleet of retrying workers from synchronising.
+                backoff = random.uniform(0, self.retry_base_delay * (2 ** attempt))
+                time.sleep(min(backoff, max(0.0, deadline - time.monotonic())))
+
+        raise AIServiceUnavailable(f"AI generation failed: {last_error or 'deadline exceeded'}")
+
+    def _request_fn(
+        self, model: str, output_mode: str, image_detail: str, image_url: str
+    ) -> Callable[[float], Any]:
+        extra = {}
+        if output_mode == "json":
+            extra["response_format"] = {"type": "json_schema", "json_schema": PRODUCT_LISTING_SCHEMA}
+
+        def request(timeout: float):
+            return self.client.chat.completions.create(
+                model=model,
                 messages=[
                     {
                         "role": "user",
                         "content": [
                             {
                                 "type": "text",
-                                "text": prompt
+                                "text": PROMPTS[output_mode]
                             },
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/{image_format};base64,{image_data}"
+                                    "url": image_url,
+                                    "detail": image_detail
                                 }
                             }
                         ]
                     }
                 ],
-                max_tokens=500
+                max_tokens=self.max_tokens,
+                timeout=timeout,
+                **extra
             )
-            
-            content = response.choices[0].message.content
-            
-            title = ""
-            description = ""
-            keywords = []
-            
-            lines = content.split('\n')
-            for line in lines:
-                line = line.strip()
-                if line.startswith('TITLE:'):
-                    title = line.replace('TITLE:', '').strip()
-                elif line.startswith('DESCRIPTION:'):
-                    description = line.replace('DESCRIPTION:', '').strip()
-                elif line.startswith('KEYWORDS:'):
-                    keywords_str = line.replace('KEYWORDS:', '').strip()
-                    keywords = [k.strip() for k in keywords_str.split(',')]
-            
-            if not title or not description:
-                title = "Product"
-                description = content[:200]
-            
-            return {
-                "title": title,
-                "description": description,
-                "keywords": keywords if keywords else ["product"]
-            }
-            
+
+        return request
+
+    @staticmethod
+    def _parse_content(content: str) -> Dict[str, any]:
+        title = ""
+        description = ""
+        keywords = []
+
+        lines = content.split('\n')
+        for line in lines:
+            line = line.strip()
+            if line.startswith('TITLE:'):
+                title = line.replace('TITLE:', '').strip()
+            elif line.startswith('DESCRIPTION:'):
+                description = line.replace('DESCRIPTION:', '').strip()
+            elif line.startswith('KEYWORDS:'):
+                keywords_str = line.replace('KEYWORDS:', '').strip()
+                keywords = [k.strip() for k in keywords_str.split(',')]
+
+        if not title or not description:
+            title = "Product"
+            description = content[:200]
+
+        return {
+            "title": title,
+            "description": description,
+            "keywords": keywords if keywords else ["product"]
+        }
+
+    def _parse_response(self, response, output_mode: str) -> Dict[str, any]:
+        content = response.choices[0].message.content or ""
+
+        if output_mode == "json":
+            try:
+                data = json.loads(content)
+                return {
+                    "title": str(data["title"]).strip() or "Product",
+                    "description": str(data["description"]).strip(),
+                    "keywords": [str(k).strip() for k in data.get("keywords") or [] if str(k).strip()] or ["product"]
+                }
+            except (ValueError, KeyError, TypeError):
+                pass
+
+        return self._parse_content(content)
+
+    @staticmethod
+    def _prepare_image(image_data: str) -> Tuple[str, Optional[Tuple[int, int]]]:
+        """Return the image URL to send and, when readable, the image dimensions."""
+        if image_data.startswith('https://'):
+            # Signed Storage URL: the model fetches the bytes itself.
+            return image_data, None
+
+        image_format = "jpeg"
+        if image_data.startswith('data:image'):
+            format_match = image_data.split(';')[0].split('/')
+            if len(format_match) > 1:
+                image_format = format_match[1]
+            image_data = image_data.split(',')[1]
+
+        size = None
+        try:
+            # Only the header is parsed; pixels are never decoded.
+            with Image.open(BytesIO(base64.b64decode(image_data))) as image:
+                size = image.size
+        except Exception:
+            pass
+
+        return f"data:image/{image_format};base64,{image_data}", size
+
+    def _usage(self, response, model: str, output_mode: str, image_detail: str,
+               size: Optional[Tuple[int, int]], latency: float) -> Dict[str, Any]:
+        usage = getattr(response, "usage", None)
+        return {
+            "model": model,
+            "output_mode": output_mode,
+            "image_detail": image_detail,
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "image_tokens": estimate_image_tokens(*(size or (None, None)), image_detail),
+            "latency_ms": round(latency * 1000, 1)
+        }
+
+    def _record_usage(self, usage: Dict[str, Any], user_id: Optional[str]):
+        self._count("prompt_tokens", usage["prompt_tokens"])
+        self._count("completion_tokens", usage["completion_tokens"])
+
+        if user_id:
+            try:
+                firebase_service.record_ai_usage(user_id, usage)
+            except Exception as e:
+                print(f"Error recording AI usage: {e}")
+
+    def describe_image(
+        self,
+        image_data: str,
+        output_mode: Optional[str] = None,
+        image_detail: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> Tuple[Dict[str, any], Dict[str, Any]]:
+        """
+        Single vision call with retries but without the breaker or usage
+        recording. Returns (listing, usage). Used by the prompt bench.
+        """
+        output_mode = output_mode or self.output_mode
+        image_detail = image_detail or self.image_detail
+        model = model or self.model
+        image_url, size = self._prepare_image(image_data)
+
+        started = time.monotonic()
+        response = self._call_with_retries(
+            self._request_fn(model, output_mode, image_detail, image_url), self.max_retries
+        )
+        usage = self._usage(response, model, output_mode, image_detail, size, time.monotonic() - started)
+        return self._parse_response(response, output_mode), usage
+
+    def _fallback(self, image_url: str, size: Optional[Tuple[int, int]], user_id: Optional[str]) -> Dict[str, any]:
+        """Degraded answer used while the breaker is open."""
+        self._count("fallbacks")
+
+        if self.fallback_model:
+            try:
+                started = time.monotonic()
+                response = self._request_fn(
+                    self.fallback_model, self.output_mode, "low", image_url
+                )(self.attempt_timeout)
+                self._record_usage(
+                    self._usage(response, self.fallback_model, self.output_mode, "low",
+                                size, time.monotonic() - started),
+                    user_id
+                )
+                result = self._parse_response(response, self.output_mode)
+                result["degraded"] = True
+                return result
+            except Exception as e:
+                print(f"Fallback model failed: {e}")
+
+        return {
+            "title": "",
+            "description": "",
+            "keywords": [],
+            "degraded": True
+        }
+
+    def generate_product_description(self, image_data: str, user_id: Optional[str] = None) -> Dict[str, any]:
+        image_url, size = self._prepare_image(image_data)
+
+        self._count("calls")
+        # Surface a missing API key before the breaker hands out its probe slot.
+        self.client
+
+        if not self._breaker.allow_request():
+            return self._fallback(image_url, size, user_id)
+
+        started = time.monotonic()
+        try:
+            response = self._call_with_retries(
+                self._request_fn(self.model, self.output_mode, self.image_detail, image_url),
+                self.max_retries
+            )
+        except AIServiceUnavailable as e:
+            self._count("failures")
+            self._breaker.record_failure()
+            e.retry_after = int(self._breaker.reset_timeout)
+            print(f"Error generating product description: {e}")
+            raise
         except Exception as e:
+            # Bad requests (e.g. an unreadable image) mean the upstream answered,
+            # so they count as healthy for the breaker.
+            self._breaker.record_success()
+            self._count("failures")
             print(f"Error generating product description: {e}")
-            raise Exception(f"AI generation failed: {str(e)}")
+            raise AIServiceError(f"AI generation failed: {str(e)}")
+
+        self._breaker.record_success()
+        self._count("successes")
+        self._record_usage(
+            self._usage(response, self.model, self.output_mode, self.image_detail,
+                        size, time.monotonic() - started),
+            user_id
+        )
+        return self._parse_response(response, self.output_mode)
+
+    def metrics(self) -> Dict:
+        p50 = self._percentile(50)
+        p95 = self._percentile(95)
+        with self._metrics_lock:
+            counters = dict(self._counters)
+        counters["latency_p50_ms"] = round(p50 * 1000, 1) if p50 is not None else None
+        counters["latency_p95_ms"] = round(p95 * 1000, 1) if p95 is not None else None
+        counters["circuit_breaker"] = self._breaker.snapshot()
+        return counters
 
 
 ai_service = AIService()
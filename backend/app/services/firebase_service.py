@@ -1,9 +1,15 @@
 import firebase_admin
 from firebase_admin import credentials, firestore, storage, auth
-from typing import Dict, List, Optional
-from datetime import datetime
+from google.api_core.exceptions import NotFound
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from urllib.parse import quote, unquote, urlparse
 import os
 import json
+import uuid
+
+
+SUMMARY_FIELDS = ('title', 'status', 'thumbnail_url', 'created_at', 'updated_at')
 
 
 class FirebaseService:
@@ -66,14 +72,18 @@ class FirebaseService:
         product_data['created_at'] = datetime.utcnow().isoformat()
         product_data['updated_at'] = datetime.utcnow().isoformat()
         product_data['is_deleted'] = False
+        # '' sorts before any timestamp, so unleased products match the review queue query.
+        product_data['lease_expires_at'] = ''
+        product_data['thumbnail_status'] = 'pending'
         
         doc_ref = self.db.collection('products').document()
         doc_ref.set(product_data)
+        self._sync_summary(doc_ref.id, product_data)
         return doc_ref.id
     
-    def get_product(self, product_id: str) -> Optional[Dict]:
+    def get_product(self, product_id: str, fields: Optional[List[str]] = None) -> Optional[Dict]:
         doc_ref = self.db.collection('products').document(product_id)
-        doc = doc_ref.get()
+        doc = doc_ref.get(field_paths=fields)
         
         if doc.exists:
             data = doc.to_dict()
@@ -81,12 +91,31 @@ class FirebaseService:
             return data
         return None
     
-    def get_products_by_user(self, user_id: str, include_deleted: bool = False) -> List[Dict]:
+    def get_products(self, product_ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Optional[Dict]]:
+        """Fetch many products in one round-trip; ids that do not exist map to None."""
+        collection = self.db.collection('products')
+        results = {product_id: None for product_id in product_ids}
+        refs = [collection.document(product_id) for product_id in results]
+        
+        for doc in self.db.get_all(refs, field_paths=fields):
+            if doc.exists:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                results[doc.id] = data
+        
+        return results
+    
+    def get_products_by_user(
+        self, user_id: str, include_deleted: bool = False, fields: Optional[List[str]] = None
+    ) -> List[Dict]:
         query = self.db.collection('products').where('user_id', '==', user_id)
         
         if not include_deleted:
             query = query.where('is_deleted', '==', False)
         
+        if fields is not None:
+            query = query.select(fields)
+        
         docs = query.stream()
         products = []
         for doc in docs:
@@ -96,7 +125,9 @@ class FirebaseService:
         
         return products
     
-    def get_all_products(self, status: Optional[str] = None, include_deleted: bool = False) -> List[Dict]:
+    def get_all_products(
+        self, status: Optional[str] = None, include_deleted: bool = False, fields: Optional[List[str]] = None
+    ) -> List[Dict]:
         query = self.db.collection('products')
         
         if status:
@@ -105,6 +136,9 @@ class FirebaseService:
         if not include_deleted:
             query = query.where('is_deleted', '==', False)
         
+        if fields is not None:
+            query = query.select(fields)
+        
         docs = query.stream()
         products = []
         for doc in docs:
@@ -116,20 +150,533 @@ class FirebaseService:
     
     def update_product(self, product_id: str, update_data: Dict) -> bool:
         doc_ref = self.db.collection('products').document(product_id)
+        snapshot = doc_ref.get()
         
-        if not doc_ref.get().exists:
+        if not snapshot.exists:
             return False
         
         update_data['updated_at'] = datetime.utcnow().isoformat()
+        current = snapshot.to_dict()
+        
         doc_ref.update(update_data)
+        self._sync_summary(product_id, current, update_data)
         return True
     
     def update_product_status(self, product_id: str, status: str) -> bool:
-        return self.update_product(product_id, {'status': status})
+        # A decision ends any review lease on the product.
+        return self.update_product(product_id, {
+            'status': status,
+            'lease_owner': firestore.DELETE_FIELD,
+            'lease_expires_at': ''
+        })
+    
+    def decide_product_status(self, product_id: str, status: str, moderator_id: str) -> Tuple[Optional[Dict], bool]:
+        """
+        Record a moderation decision unless another moderator holds an unexpired
+        lease on the product. The lease check and the write run in one
+        transaction, so a lease claimed in between is never overridden.
+        Returns (product as read, applied); product is None if it does not exist.
+        """
+        doc_ref = self.db.collection('products').document(product_id)
+        update_data = {
+            'status': status,
+            'lease_owner': firestore.DELETE_FIELD,
+            'lease_expires_at': '',
+            'updated_at': datetime.utcnow().isoformat()
+        }
+        
+        @firestore.transactional
+        def decide(transaction) -> Tuple[Optional[Dict], bool]:
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None, False
+            
+            data = snapshot.to_dict()
+            owner = data.get('lease_owner')
+            if owner and owner != moderator_id and (data.get('lease_expires_at') or '') > datetime.utcnow().isoformat():
+                return data, False
+            
+            transaction.update(doc_ref, update_data)
+            return data, True
+        
+        product, applied = decide(self.db.transaction())
+        if applied:
+            self._sync_summary(product_id, product, update_data)
+        if product is not None:
+            product['id'] = product_id
+        return product, applied
+    
+    def claim_review_leases(self, moderator_id: str, count: int, lease_seconds: int) -> Dict:
+        """
+        Lease up to `count` pending products to `moderator_id`: unleased ones
+        oldest first, then ones whose lease has expired. Candidates come from a
+        plain query on the indexed `lease_expires_at`, so products held by other
+        moderators are never scanned; only the chosen documents are re-read and
+        leased in a transaction, and lost races are made up from the next page.
+        The caller's own leases are renewed and returned again.
+        """
+        now = datetime.utcnow()
+        now_iso = now.isoformat()
+        expires_at = (now + timedelta(seconds=lease_seconds)).isoformat()
+        collection = self.db.collection('products')
+        
+        @firestore.transactional
+        def lease(transaction, refs) -> List[Dict]:
+            leased = []
+            for doc in transaction.get_all(refs):
+                data = doc.to_dict() if doc.exists else None
+                if not data or data.get('status') != 'pending' or data.get('is_deleted', False):
+                    continue
+                owner = data.get('lease_owner')
+                if owner and owner != moderator_id and (data.get('lease_expires_at') or '') > now_iso:
+                    continue
+                
+                transaction.update(doc.reference, {
+                    'lease_owner': moderator_id,
+                    'lease_expires_at': expires_at
+                })
+                data.update({'id': doc.id, 'lease_owner': moderator_id, 'lease_expires_at': expires_at})
+                leased.append(data)
+            return leased
+        
+        query = (
+            collection
+            .where('status', '==', 'pending')
+            .where('is_deleted', '==', False)
+            .where('lease_expires_at', '<', now_iso)
+            .order_by('lease_expires_at')
+            .order_by('created_at')
+            .select(['lease_expires_at', 'created_at'])
+            .limit(max(count, 20))
+        )
+        
+        refs = [
+            doc.reference for doc in
+            collection.where('lease_owner', '==', moderator_id).where('status', '==', 'pending').select([]).stream()
+        ]
+        seen = set()
+        products = []
+        cursor = None
+        exhausted = False
+        
+        while len(products) < count:
+            if not refs and not exhausted:
+                page = list((query.start_after(cursor) if cursor else query).stream())
+                exhausted = len(page) < max(count, 20)
+                if page:
+                    cursor = page[-1]
+                refs = [doc.reference for doc in page if doc.id not in seen]
+            if not refs:
+                break
+            
+            needed = count - len(products)
+            chosen, refs = refs[:needed], refs[needed:]
+            seen.update(ref.id for ref in chosen)
+            products.extend(lease(self.db.transaction(), chosen))
+        
+        products.sort(key=lambda product: product.get('created_at') or '')
+        return {'lease_expires_at': expires_at, 'products': products}
+    
+    def backfill_review_lease_fields(self) -> int:
+        """Give pending products created before review leases a `lease_expires_at` of ''."""
+        docs = (
+            self.db.collection('products')
+            .where('status', '==', 'pending')
+            .select(['lease_expires_at'])
+            .stream()
+        )
+        
+        updated = 0
+        batch = self.db.batch()
+        for doc in docs:
+            if 'lease_expires_at' in (doc.to_dict() or {}):
+                continue
+            batch.update(doc.reference, {'lease_expires_at': ''})
+            updated += 1
+            if updated % 500 == 0:
+                batch.commit()
+                batch = self.db.batch()
+        if updated % 500:
+            batch.commit()
+        return updated
+    
+    def release_review_leases(self, moderator_id: str) -> int:
+        docs = list(
+            self.db.collection('products')
+            .where('lease_owner', '==', moderator_id)
+            .select([])
+            .stream()
+        )
+        
+        batch = self.db.batch()
+        for i, doc in enumerate(docs, start=1):
+            batch.update(doc.reference, {
+                'lease_owner': firestore.DELETE_FIELD,
+                'lease_expires_at': ''
+            })
+            if i % 500 == 0:
+                batch.commit()
+                batch = self.db.batch()
+        if len(docs) % 500:
+            batch.commit()
+        return len(docs)
     
     def soft_delete_product(self, product_id: str) -> bool:
         return self.update_product(product_id, {'is_deleted': True})
     
+    def set_product_image_variants(self, product_id: str, variants: Dict[str, str], thumbnail_url: str) -> bool:
+        doc_ref = self.db.collection('products').document(product_id)
+        
+        try:
+            snapshot = doc_ref.get()
+            if not snapshot.exists:
+                return False
+            
+            # Derived data only, so updated_at is left alone.
+            update_data = {
+                'image_variants': variants,
+                'thumbnail_url': thumbnail_url,
+                'thumbnail_status': 'done'
+            }
+            doc_ref.update(update_data)
+            self._sync_summary(product_id, snapshot.to_dict(), update_data)
+            return True
+        except Exception as e:
+            print(f"Error saving image variants for product {product_id}: {e}")
+            return False
+    
+    def set_thumbnail_status(self, product_id: str, status: str) -> bool:
+        """Mark a product's thumbnail job as 'pending', 'done', 'skipped' or 'failed'."""
+        try:
+            self.db.collection('products').document(product_id).update({'thumbnail_status': status})
+            return True
+        except Exception as e:
+            print(f"Error saving thumbnail status for product {product_id}: {e}")
+            return False
+    
+    def get_products_needing_thumbnails(self, statuses: Tuple[str, ...] = ('pending',)) -> List[Dict]:
+        """Live products whose thumbnail job is in one of `statuses` (lost, never run, or failed)."""
+        docs = (
+            self.db.collection('products')
+            .where('thumbnail_status', 'in', list(statuses))
+            .select(['user_id', 'image_url', 'is_deleted'])
+            .stream()
+        )
+        
+        products = []
+        for doc in docs:
+            data = doc.to_dict()
+            if data.get('image_url') and not data.get('is_deleted', False):
+                data['id'] = doc.id
+                products.append(data)
+        return products
+    
+    def backfill_thumbnail_status(self) -> int:
+        """Stamp `thumbnail_status` on products created before it existed ('done' if they have variants)."""
+        docs = (
+            self.db.collection('products')
+            .select(['thumbnail_status', 'image_variants'])
+            .stream()
+        )
+        
+        updated = 0
+        batch = self.db.batch()
+        for doc in docs:
+            data = doc.to_dict() or {}
+            if 'thumbnail_status' in data:
+                continue
+            batch.update(doc.reference, {'thumbnail_status': 'done' if data.get('image_variants') else 'pending'})
+            updated += 1
+            if updated % 500 == 0:
+                batch.commit()
+                batch = self.db.batch()
+        if updated % 500:
+            batch.commit()
+        return updated
+    
+    def set_product_image_hash(self, product_id: str, image_hash: str, duplicate_of: List[str]) -> bool:
+        try:
+            self.db.collection('products').document(product_id).update({
+                'image_hash': image_hash,
+                'duplicate_of': duplicate_of
+            })
+            return True
+        except Exception as e:
+            print(f"Error saving image hash for product {product_id}: {e}")
+            return False
+    
+    def _summary_ref(self, user_id: str):
+        return self.db.collection('user_product_summaries').document(user_id)
+    
+    def _summary_items(self, user_id: str):
+        return self._summary_ref(user_id).collection('items')
+    
+    @staticmethod
+    def _summary_entry(data: Dict) -> Dict:
+        return {field: data.get(field) for field in SUMMARY_FIELDS}
+    
+    def _sync_summary(self, product_id: str, current: Dict, update_data: Optional[Dict] = None):
+        """
+        Mirror a product write into `user_product_summaries/{uid}/items/{id}`.
+        
+        Without `update_data` (create, restore) the full entry is written from
+        `current`. Otherwise only the summary fields present in `update_data`
+        are updated, so concurrent writers touching different fields (e.g. the
+        thumbnail job and a seller's PATCH) cannot overwrite each other with a
+        stale snapshot; `update` also never recreates the item of a product
+        deleted in the meantime. Best-effort and outside the product write: a
+        failure here is logged and repaired by `scripts/product_summaries.py rebuild`.
+        """
+        user_id = current.get('user_id')
+        if not user_id:
+            return
+        
+        item_ref = self._summary_items(user_id).document(product_id)
+        was_deleted = current.get('is_deleted', False)
+        try:
+            if update_data is None:
+                if was_deleted:
+                    item_ref.delete()
+                else:
+                    item_ref.set(self._summary_entry(current))
+                return
+            
+            if update_data.get('is_deleted', was_deleted):
+                if not was_deleted:
+                    item_ref.delete()
+                return
+            
+            if was_deleted:
+                # Un-deleted: there is no item to update, so write it in full.
+                item_ref.set(self._summary_entry({**current, **update_data}))
+                return
+            
+            changes = {field: update_data[field] for field in SUMMARY_FIELDS if field in update_data}
+            if changes:
+                item_ref.update(changes)
+        except NotFound:
+            # No item yet (summary never built for this user); built on first read.
+            pass
+        except Exception as e:
+            print(f"Error updating product summary for {product_id}: {e}")
+    
+    def get_user_product_summary(self, user_id: str) -> List[Dict]:
+        """
+        Dashboard listing served from the `user_product_summaries/{uid}/items`
+        subcollection instead of a query over full `products` documents. Users
+        whose summary has never been rebuilt (no `rebuilt_at` marker) get it
+        built on first use, since their older products have no items yet.
+        """
+        doc = self._summary_ref(user_id).get()
+        if doc.exists and (doc.to_dict() or {}).get('rebuilt_at'):
+            entries = {item.id: item.to_dict() for item in self._summary_items(user_id).stream()}
+        else:
+            entries = self.rebuild_user_product_summary(user_id)
+        
+        summaries = [{**self._summary_entry(entry), 'id': product_id} for product_id, entry in entries.items()]
+        summaries.sort(key=lambda entry: entry.get('created_at') or '', reverse=True)
+        return summaries
+    
+    def _expected_summary(self, user_id: str) -> Dict[str, Dict]:
+        query = (
+            self.db.collection('products')
+            .where('user_id', '==', user_id)
+            .where('is_deleted', '==', False)
+            .select(list(SUMMARY_FIELDS))
+        )
+        return {doc.id: self._summary_entry(doc.to_dict()) for doc in query.stream()}
+    
+    def rebuild_user_product_summary(self, user_id: str) -> Dict[str, Dict]:
+        entries = self._expected_summary(user_id)
+        items = self._summary_items(user_id)
+        stale_ids = [doc.id for doc in items.select([]).stream() if doc.id not in entries]
+        
+        writes = [(product_id, entry) for product_id, entry in entries.items()]
+        writes += [(product_id, None) for product_id in stale_ids]
+        for start in range(0, len(writes), 500):
+            batch = self.db.batch()
+            for product_id, entry in writes[start:start + 500]:
+                if entry is None:
+                    batch.delete(items.document(product_id))
+                else:
+                    batch.set(items.document(product_id), entry)
+            batch.commit()
+        
+        self._summary_ref(user_id).set({'rebuilt_at': datetime.utcnow().isoformat()})
+        return entries
+    
+    def check_user_product_summary(self, user_id: str) -> Dict[str, List[str]]:
+        """Compare the summary items against `products`; empty lists mean consistent."""
+        expected = self._expected_summary(user_id)
+        actual = {item.id: item.to_dict() for item in self._summary_items(user_id).stream()}
+        
+        return {
+            'missing': sorted(set(expected) - set(actual)),
+            'extra': sorted(set(actual) - set(expected)),
+            'stale': sorted(
+                product_id for product_id in set(expected) & set(actual)
+                if self._summary_entry(actual[product_id]) != expected[product_id]
+            )
+        }
+    
+    def get_product_owner_ids(self) -> List[str]:
+        docs = self.db.collection('products').select(['user_id']).stream()
+        return sorted({doc.to_dict().get('user_id') for doc in docs} - {None})
+    
+    def storage_path_from_url(self, url: str) -> Optional[str]:
+        """Map a Firebase download URL (or a gs:// / GCS URL) to an object path in our bucket."""
+        parsed = urlparse(url)
+        bucket_name = self.bucket.name
+        
+        if parsed.scheme == 'gs' and parsed.netloc == bucket_name:
+            return parsed.path.lstrip('/')
+        
+        if parsed.netloc == 'firebasestorage.googleapis.com':
+            prefix = f"/v0/b/{bucket_name}/o/"
+            if parsed.path.startswith(prefix):
+                return unquote(parsed.path[len(prefix):])
+        
+        if parsed.netloc == 'storage.googleapis.com':
+            prefix = f"/{bucket_name}/"
+            if parsed.path.startswith(prefix):
+                return unquote(parsed.path[len(prefix):])
+        
+        return None
+    
+    def upload_blob(self, path: str, data: bytes, content_type: str) -> str:
+        """Upload bytes to Storage and return a Firebase download URL for them."""
+        token = str(uuid.uuid4())
+        blob = self.bucket.blob(path)
+        blob.metadata = {'firebaseStorageDownloadTokens': token}
+        blob.cache_control = 'public, max-age=31536000'
+        blob.upload_from_string(data, content_type=content_type)
+        
+        return (
+            f"https://firebasestorage.googleapis.com/v0/b/{self.bucket.name}/o/"
+            f"{quote(path, safe='')}?alt=media&token={token}"
+        )
+    
+    def get_archive_candidates(
+        self,
+        reason: str,
+        limit: int,
+        start_after: Optional[str] = None,
+        rejected_before: Optional[str] = None
+    ) -> Tuple[List, Optional[str]]:
+        """
+        Next page of products eligible for archival, ordered by document id.
+        `reason` is 'deleted' (soft-deleted) or 'rejected' (rejected and last
+        updated before `rejected_before`). Returns (snapshots, last_scanned_id).
+        """
+        collection = self.db.collection('products')
+        
+        if reason == 'deleted':
+            query = collection.where('is_deleted', '==', True)
+        elif reason == 'rejected':
+            query = collection.where('status', '==', 'rejected')
+        else:
+            raise ValueError(f"Unknown archive reason: {reason}")
+        
+        query = query.order_by('__name__').limit(limit)
+        if start_after:
+            query = query.start_after({'__name__': collection.document(start_after)})
+        
+        docs = list(query.stream())
+        last_id = docs[-1].id if docs else None
+        
+        if reason == 'rejected':
+            # Filtered here so the query can keep a single document-id cursor.
+            docs = [
+                doc for doc in docs
+                if (doc.to_dict().get('updated_at') or '') < rejected_before
+            ]
+        
+        return docs, last_id
+    
+    def archive_products(self, snapshots: List, reason: str) -> int:
+        """
+        Move products into `products_archive` and out of their owners' summaries.
+        Each delete is conditioned on the document being unchanged since it was
+        read, so a product edited mid-run stays live.
+        """
+        archived_at = datetime.utcnow().isoformat()
+        
+        def stage(batch, snapshot):
+            data = snapshot.to_dict()
+            batch.set(
+                self.db.collection('products_archive').document(snapshot.id),
+                {**data, 'archived_at': archived_at, 'archive_reason': reason}
+            )
+            batch.delete(
+                snapshot.reference,
+                option=self.db.write_option(last_update_time=snapshot.update_time)
+            )
+            if data.get('user_id'):
+                batch.delete(self._summary_items(data['user_id']).document(snapshot.id))
+        
+        archived = 0
+        for start in range(0, len(snapshots), 150):
+            chunk = snapshots[start:start + 150]
+            batch = self.db.batch()
+            for snapshot in chunk:
+                stage(batch, snapshot)
+            
+            try:
+                batch.commit()
+                archived += len(chunk)
+                continue
+            except Exception as e:
+                print(f"Archive batch failed, retrying documents individually: {e}")
+            
+            for snapshot in chunk:
+                batch = self.db.batch()
+                stage(batch, snapshot)
+                try:
+                    batch.commit()
+                    archived += 1
+                except Exception as e:
+                    print(f"Skipping product {snapshot.id}: {e}")
+        
+        return archived
+    
+    def restore_product(self, product_id: str, undelete: bool = False) -> bool:
+        """Move an archived product back into `products` (optionally clearing is_deleted)."""
+        archive_ref = self.db.collection('products_archive').document(product_id)
+        snapshot = archive_ref.get()
+        
+        if not snapshot.exists:
+            return False
+        
+        data = snapshot.to_dict()
+        data.pop('archived_at', None)
+        data.pop('archive_reason', None)
+        if undelete:
+            data['is_deleted'] = False
+        
+        product_ref = self.db.collection('products').document(product_id)
+        batch = self.db.batch()
+        batch.create(product_ref, data)
+        batch.delete(archive_ref)
+        batch.commit()
+        self._sync_summary(product_id, data)
+        return True
+    
+    def record_ai_usage(self, user_id: str, usage: Dict):
+        """Add one AI call to the caller's daily totals in `ai_usage/{uid}_{YYYY-MM-DD}`."""
+        now = datetime.utcnow()
+        day = now.strftime('%Y-%m-%d')
+        
+        self.db.collection('ai_usage').document(f"{user_id}_{day}").set({
+            'user_id': user_id,
+            'day': day,
+            'calls': firestore.Increment(1),
+            'prompt_tokens': firestore.Increment(usage.get('prompt_tokens') or 0),
+            'completion_tokens': firestore.Increment(usage.get('completion_tokens') or 0),
+            'image_tokens': firestore.Increment(usage.get('image_tokens') or 0),
+            'latency_ms_total': firestore.Increment(usage.get('latency_ms') or 0),
+            'updated_at': now.isoformat()
+        }, merge=True)
+    
     def verify_firebase_token(self, token: str) -> Optional[Dict]:
         try:
             if not firebase_admin._apps:
@@ -0,0 +1,105 @@
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class IdempotencyStore:
+    """
+    In-memory TTL store of mutation results keyed by `Idempotency-Key`.
+
+    The first request for a key is marked in progress; once it succeeds its
+    response body is kept for IDEMPOTENCY_TTL_SECONDS and replayed to retries
+    without touching Firestore. Failed requests release the key so the client
+    can retry. Keys are scoped per user, method and path. The store is
+    per-process, so multi-instance deployments need sticky routing for retries
+    to hit it.
+    """
+
+    NEW = "new"
+    REPLAY = "replay"
+    IN_PROGRESS = "in_progress"
+    MISMATCH = "mismatch"
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(IdempotencyStore, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.ttl = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+            self.max_entries = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+            self._entries: Dict[str, Dict[str, Any]] = {}
+            self._lock = threading.Lock()
+            self._initialized = True
+
+    @staticmethod
+    def scope(user_id: str, method: str, path: str, key: str) -> str:
+        return f"{user_id}:{method}:{path}:{key}"
+
+    @staticmethod
+    def fingerprint(payload: Any) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _evict(self, now: float):
+        expired = [key for key, entry in self._entries.items() if entry["expires_at"] <= now]
+        for key in expired:
+            del self._entries[key]
+
+        # Make room for the entry about to be inserted.
+        overflow = len(self._entries) - self.max_entries + 1
+        if overflow > 0:
+            # Dicts keep insertion order, so the oldest keys go first.
+            for key in list(self._entries)[:overflow]:
+                del self._entries[key]
+
+    def begin(self, scope: str, fingerprint: str) -> Tuple[str, Optional[Any]]:
+        """Claim `scope` for a new request, or report why it cannot run again."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(scope)
+            if entry is not None and entry["expires_at"] <= now:
+                del self._entries[scope]
+                entry = None
+
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    self._evict(now)
+                self._entries[scope] = {
+                    "fingerprint": fingerprint,
+                    "done": False,
+                    "body": None,
+                    "expires_at": now + self.ttl
+                }
+                return self.NEW, None
+
+            if entry["fingerprint"] != fingerprint:
+                return self.MISMATCH, None
+            if not entry["done"]:
+                return self.IN_PROGRESS, None
+            return self.REPLAY, entry["body"]
+
+    def complete(self, scope: Optional[str], body: Any):
+        if scope is None:
+            return
+        with self._lock:
+            entry = self._entries.get(scope)
+            if entry is not None:
+                entry.update({"done": True, "body": body, "expires_at": time.monotonic() + self.ttl})
+
+    def abandon(self, scope: Optional[str]):
+        if scope is None:
+            return
+        with self._lock:
+            entry = self._entries.get(scope)
+            if entry is not None and not entry["done"]:
+                del self._entries[scope]
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,201 @@
+from typing import Dict, List, Optional, Tuple
+import os
+import threading
+
+from app.services.firebase_service import firebase_service
+from app.services.image_variants import dhash
+
+
+def format_hash(value: int) -> str:
+    return f"{value:016x}"
+
+
+def parse_hash(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value, 16) if value else None
+    except ValueError:
+        return None
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance."""
+
+    def __init__(self):
+        # Node layout: [hash, product_ids, {distance: child}]
+        self._root = None
+
+    def add(self, value: int, product_id: str):
+        if self._root is None:
+            self._root = [value, [product_id], {}]
+            return
+
+        node = self._root
+        while True:
+            distance = (value ^ node[0]).bit_count()
+            if distance == 0:
+                node[1].append(product_id)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [product_id], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, int, str]]:
+        """All (distance, hash, product_id) within `max_distance` of `value`."""
+        if self._root is None:
+            return []
+
+        matches = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = (value ^ node[0]).bit_count()
+            if distance <= max_distance:
+                matches.extend((distance, node[0], product_id) for product_id in node[1])
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return matches
+
+
+class ImageHashIndex:
+    """
+    In-memory near-duplicate index of product image dHashes.
+
+    Rebuilt from Firestore at startup and updated as products are created,
+    deleted or rejected. The tree is append-only; `_current` records each live
+    product's latest hash so replaced or deleted entries are ignored at lookup
+    time until the next rebuild drops them. Changes made while a rebuild is
+    streaming are logged and replayed onto the new tree before it is swapped in.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ImageHashIndex, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.max_distance = int(os.getenv("DUPLICATE_HASH_DISTANCE", "6"))
+            self._tree = BKTree()
+            self._current: Dict[str, Tuple[int, str]] = {}
+            self._rebuild_log: Optional[List[Tuple[str, Optional[int], Optional[str]]]] = None
+            self._lock = threading.Lock()
+            self._initialized = True
+
+    @staticmethod
+    def _apply(tree: BKTree, current: Dict[str, Tuple[int, str]], product_id: str,
+               value: Optional[int], user_id: Optional[str]):
+        """Add (value set) or discard (value None) one product."""
+        if value is None:
+            current.pop(product_id, None)
+        elif current.get(product_id, (None, None))[0] != value:
+            tree.add(value, product_id)
+            current[product_id] = (value, user_id)
+
+    def rebuild(self) -> int:
+        with self._lock:
+            self._rebuild_log = []
+
+        try:
+            docs = (
+                firebase_service.db.collection('products')
+                .where('is_deleted', '==', False)
+                .select(['image_hash', 'user_id', 'status'])
+                .stream()
+            )
+
+            tree = BKTree()
+            current = {}
+            for doc in docs:
+                data = doc.to_dict()
+                value = parse_hash(data.get('image_hash'))
+                if value is not None and data.get('status') != 'rejected':
+                    self._apply(tree, current, doc.id, value, data.get('user_id'))
+
+            with self._lock:
+                for product_id, value, user_id in self._rebuild_log:
+                    self._apply(tree, current, product_id, value, user_id)
+                self._tree = tree
+                self._current = current
+        finally:
+            with self._lock:
+                self._rebuild_log = None
+
+        print(f"Image hash index rebuilt with {len(current)} products")
+        return len(current)
+
+    def rebuild_in_background(self):
+        def run():
+            try:
+                self.rebuild()
+            except Exception as e:
+                print(f"Error rebuilding image hash index: {e}")
+
+        threading.Thread(target=run, name="image-hash-index", daemon=True).start()
+
+    @staticmethod
+    def hash_image(image_bytes: bytes) -> Optional[str]:
+        try:
+            return format_hash(dhash(image_bytes))
+        except Exception as e:
+            print(f"Error hashing image: {e}")
+            return None
+
+    def _record(self, product_id: str, value: Optional[int], user_id: Optional[str]):
+        with self._lock:
+            self._apply(self._tree, self._current, product_id, value, user_id)
+            if self._rebuild_log is not None:
+                self._rebuild_log.append((product_id, value, user_id))
+
+    def add(self, product_id: str, user_id: str, image_hash: str):
+        value = parse_hash(image_hash)
+        if value is not None:
+            self._record(product_id, value, user_id)
+
+    def discard(self, product_id: str):
+        self._record(product_id, None, None)
+
+    def find(self, image_hash: str, user_id: Optional[str] = None, limit: int = 5) -> List[str]:
+        """Ids of live products whose image is within the distance threshold, closest first."""
+        value = parse_hash(image_hash)
+        if value is None:
+            return []
+
+        with self._lock:
+            matches = self._tree.search(value, self.max_distance)
+            live = [
+                (distance, product_id) for distance, node_hash, product_id in matches
+                if self._current.get(product_id, (None, None))[0] == node_hash and
+                (user_id is None or self._current[product_id][1] == user_id)
+            ]
+
+        live.sort()
+        return list(dict.fromkeys(product_id for _, product_id in live))[:limit]
+
+    def find_live(self, image_hash: str, limit: int = 5) -> List[str]:
+        """
+        Like `find`, but confirms the matches against Firestore and discards
+        any that were deleted, rejected or archived elsewhere (e.g. by the
+        compaction job, which runs outside this process).
+        """
+        candidates = self.find(image_hash, limit=limit * 2)
+        if not candidates:
+            return []
+
+        products = firebase_service.get_products(candidates, fields=['is_deleted', 'status'])
+        live = []
+        for product_id in candidates:
+            product = products.get(product_id)
+            if not product or product.get('is_deleted') or product.get('status') == 'rejected':
+                self.discard(product_id)
+            else:
+                live.append(product_id)
+        return live[:limit]
+
+
+image_hash_index = ImageHashIndex()
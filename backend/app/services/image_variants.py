@@ -0,0 +1,45 @@
+"""
+CPU-bound image work (resizing, perceptual hashing) that can run inside the
+thumbnail process pool.
+
+Kept free of Firebase/FastAPI imports so spawned workers start quickly.
+"""
+
+from io import BytesIO
+from typing import Dict, List
+
+from PIL import Image, ImageOps
+
+
+def render_variants(image_bytes: bytes, widths: List[int], quality: int = 80) -> Dict[int, bytes]:
+    """Encode a WebP copy of the image at each width narrower than the original."""
+    with Image.open(BytesIO(image_bytes)) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+        targets = sorted({w for w in widths if w < image.width}) or [image.width]
+        variants = {}
+        for width in targets:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+            buffer = BytesIO()
+            resized.save(buffer, format="WEBP", quality=quality, method=4)
+            variants[width] = buffer.getvalue()
+
+        return variants
+
+
+def dhash(image_bytes: bytes, hash_size: int = 8) -> int:
+    """64-bit difference hash: one bit per horizontally adjacent pixel pair of a tiny grayscale copy."""
+    with Image.open(BytesIO(image_bytes)) as image:
+        # JPEG draft mode lets the decoder downscale by up to 8x for free.
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        small = ImageOps.exif_transpose(image).convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
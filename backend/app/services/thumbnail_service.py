@@ -0,0 +1,189 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import multiprocessing
+import os
+import queue
+import threading
+
+from app.services.firebase_service import firebase_service
+from app.services.image_hash_index import image_hash_index, format_hash
+from app.services.image_variants import render_variants, dhash
+
+
+class ThumbnailService:
+    """
+    Background pipeline that turns an uploaded product image into WebP
+    variants under `products/{userId}/thumbs/`.
+
+    Jobs go onto a bounded in-process queue; a few worker threads handle the
+    Storage download/upload and hand the resize/encode step to a process pool
+    so it never competes with request handling for the GIL. Each product
+    carries a `thumbnail_status` ('pending' until the job finishes, then
+    'done', 'skipped' or 'failed'). The queue is not durable: jobs dropped on
+    a full queue or a restart stay 'pending' and are picked up again by
+    `backfill()`, which runs at startup and from `scripts/backfill_thumbnails.py`.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ThumbnailService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.widths = [int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "320,640,960").split(",") if w.strip()]
+            self.default_width = int(os.getenv("THUMBNAIL_DEFAULT_WIDTH", "640"))
+            self.worker_count = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+            self.process_count = int(os.getenv("THUMBNAIL_PROCESSES", "2"))
+            self.max_source_bytes = int(os.getenv("THUMBNAIL_MAX_SOURCE_BYTES", str(10 * 1024 * 1024)))
+            self.backfill_on_startup = os.getenv("THUMBNAIL_BACKFILL_ON_STARTUP", "true").lower() == "true"
+            self._queue = queue.Queue(maxsize=int(os.getenv("THUMBNAIL_QUEUE_SIZE", "1000")))
+            self._pool: Optional[ProcessPoolExecutor] = None
+            self._threads: List[threading.Thread] = []
+            self._stopping = threading.Event()
+            self._initialized = True
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        # Spawn rather than fork: the parent holds gRPC/HTTP threads that must not be copied.
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.process_count,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        for i in range(self.worker_count):
+            thread = threading.Thread(target=self._worker, name=f"thumbnail-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Finish in-flight jobs and drop the rest of the backlog; the next backfill redoes it."""
+        self._stopping.set()
+        dropped = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            dropped += 1
+        if dropped:
+            print(f"Thumbnail service stopping, {dropped} queued jobs left for the next backfill")
+
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=30)
+        self._threads = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def enqueue(self, product_id: str, user_id: str, image_url: str) -> bool:
+        try:
+            self._queue.put_nowait((product_id, user_id, image_url))
+            return True
+        except queue.Full:
+            print(f"Thumbnail queue full, skipping product {product_id} until the next backfill")
+            return False
+
+    def backfill(self, statuses: Tuple[str, ...] = ('pending',)) -> int:
+        """
+        Queue every live product whose `thumbnail_status` is in `statuses`.
+        Blocks while the queue is full, so it should run off the request path.
+        """
+        queued = 0
+        for product in firebase_service.get_products_needing_thumbnails(statuses):
+            job = (product['id'], product.get('user_id'), product['image_url'])
+            while not self._stopping.is_set():
+                try:
+                    self._queue.put(job, timeout=1)
+                    queued += 1
+                    break
+                except queue.Full:
+                    continue
+            if self._stopping.is_set():
+                break
+        print(f"Thumbnail backfill queued {queued} products")
+        return queued
+
+    def backfill_in_background(self):
+        if not self.backfill_on_startup:
+            return
+
+        def run():
+            try:
+                self.backfill()
+            except Exception as e:
+                print(f"Error backfilling thumbnails: {e}")
+
+        threading.Thread(target=run, name="thumbnail-backfill", daemon=True).start()
+
+    def join(self):
+        """Block until every queued job has been processed."""
+        self._queue.join()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self.process(*job)
+            except Exception as e:
+                print(f"Error generating thumbnails for product {job[0]}: {e}")
+                firebase_service.set_thumbnail_status(job[0], 'failed')
+            finally:
+                self._queue.task_done()
+
+    def process(self, product_id: str, user_id: str, image_url: str) -> Optional[Dict[str, str]]:
+        source_path = firebase_service.storage_path_from_url(image_url)
+        if not source_path or not source_path.startswith(f"products/{user_id}/"):
+            print(f"Skipping thumbnails for product {product_id}: image is not in the owner's folder")
+            firebase_service.set_thumbnail_status(product_id, 'skipped')
+            return None
+
+        blob = firebase_service.bucket.blob(source_path)
+        blob.reload()
+        if blob.size and blob.size > self.max_source_bytes:
+            print(f"Skipping thumbnails for product {product_id}: source image too large")
+            firebase_service.set_thumbnail_status(product_id, 'skipped')
+            return None
+        image_bytes = blob.download_as_bytes()
+
+        if self._pool is not None:
+            hash_future = self._pool.submit(dhash, image_bytes)
+            rendered = self._pool.submit(render_variants, image_bytes, self.widths).result(timeout=120)
+            image_hash = format_hash(hash_future.result(timeout=120))
+        else:
+            rendered = render_variants(image_bytes, self.widths)
+            image_hash = format_hash(dhash(image_bytes))
+
+        self._record_image_hash(product_id, user_id, image_hash)
+
+        variants = {}
+        for width, data in rendered.items():
+            path = f"products/{user_id}/thumbs/{product_id}_{width}.webp"
+            variants[str(width)] = firebase_service.upload_blob(path, data, "image/webp")
+
+        thumbnail_width = min(rendered, key=lambda w: (w < self.default_width, abs(w - self.default_width)))
+        firebase_service.set_product_image_variants(product_id, variants, variants[str(thumbnail_width)])
+        return variants
+
+    @staticmethod
+    def _record_image_hash(product_id: str, user_id: str, image_hash: str):
+        """Store the server-computed hash, replacing any client-reported one that disagrees."""
+        product = firebase_service.get_product(product_id, fields=['image_hash', 'duplicate_of'])
+        if not product or product.get('image_hash') == image_hash:
+            return
+
+        duplicate_of = [pid for pid in image_hash_index.find_live(image_hash) if pid != product_id]
+        firebase_service.set_product_image_hash(product_id, image_hash, duplicate_of)
+        image_hash_index.add(product_id, user_id, image_hash)
+
+
+thumbnail_service = ThumbnailService()
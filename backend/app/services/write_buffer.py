@@ -0,0 +1,125 @@
+from typing import Dict, Optional
+import os
+import threading
+import time
+
+from app.services.firebase_service import firebase_service
+
+
+class WriteBehindBuffer:
+    """
+    Coalesces rapid successive product updates into one Firestore write.
+
+    The first update to a product opens a WRITE_COALESCE_WINDOW_MS window;
+    later updates in that window are merged into it (newest field value wins),
+    and a single background thread writes the merged update when the window
+    closes. Pending updates are flushed on shutdown. A window of 0 (the
+    default) disables buffering.
+    """
+
+    MAX_ATTEMPTS = 3
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(WriteBehindBuffer, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.window = float(os.getenv("WRITE_COALESCE_WINDOW_MS", "0")) / 1000
+            self._pending: Dict[str, Dict] = {}
+            self._due: Dict[str, float] = {}
+            self._attempts: Dict[str, int] = {}
+            self._condition = threading.Condition()
+            self._thread: Optional[threading.Thread] = None
+            self._running = False
+            self._initialized = True
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self._running
+
+    def start(self):
+        if self.window <= 0 or self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(timeout=30)
+        self._thread = None
+        self.flush()
+
+    def submit(self, product_id: str, update_data: Dict):
+        with self._condition:
+            if product_id in self._pending:
+                self._pending[product_id].update(update_data)
+            else:
+                self._pending[product_id] = dict(update_data)
+                self._due[product_id] = time.monotonic() + self.window
+                self._condition.notify()
+
+    def pending(self, product_id: str) -> Optional[Dict]:
+        """Buffered fields not yet written, for read-your-writes on the same instance."""
+        with self._condition:
+            update = self._pending.get(product_id)
+            return dict(update) if update else None
+
+    def _take(self, due_before: Optional[float]) -> Dict[str, Dict]:
+        ready = [
+            product_id for product_id, due in self._due.items()
+            if due_before is None or due <= due_before
+        ]
+        taken = {}
+        for product_id in ready:
+            taken[product_id] = self._pending.pop(product_id)
+            del self._due[product_id]
+        return taken
+
+    def _write(self, updates: Dict[str, Dict]):
+        for product_id, update_data in updates.items():
+            try:
+                firebase_service.update_product(product_id, dict(update_data))
+                self._attempts.pop(product_id, None)
+            except Exception as e:
+                attempts = self._attempts.get(product_id, 0) + 1
+                print(f"Error flushing buffered update for product {product_id} (attempt {attempts}): {e}")
+                if attempts >= self.MAX_ATTEMPTS or not self._running:
+                    self._attempts.pop(product_id, None)
+                    continue
+                self._attempts[product_id] = attempts
+                with self._condition:
+                    # Newer buffered fields take precedence over the failed ones.
+                    self._pending[product_id] = {**update_data, **self._pending.get(product_id, {})}
+                    self._due[product_id] = time.monotonic() + self.window
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running:
+                    now = time.monotonic()
+                    if self._due and min(self._due.values()) <= now:
+                        break
+                    timeout = min(self._due.values()) - now if self._due else None
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                updates = self._take(time.monotonic())
+            self._write(updates)
+
+    def flush(self):
+        with self._condition:
+            updates = self._take(None)
+        self._write(updates)
+
+
+write_buffer = WriteBehindBuffer()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Compare token cost and latency of AIService prompt variants on a folder of
+fixture images.
+
+A variant is `<output_mode>:<image_detail>`, e.g. `text:auto` (the original
+free-form prompt) or `json:low` (structured output, low-detail image).
+
+Usage:
+    python backend/scripts/ai_prompt_bench.py <fixtures_dir>
+        [--variants text:auto,json:auto,json:low] [--repeat 1]
+        [--estimate-only] [--output results.json]
+
+--estimate-only makes no API calls: it reports the prompt text size and the
+image token estimate for each variant.
+"""
+
+import argparse
+import base64
+import json
+import mimetypes
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from PIL import Image
+
+from app.services.ai_service import ai_service, estimate_image_tokens, PROMPTS
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+
+
+def load_fixtures(fixtures_dir: str):
+    fixtures = []
+    for path in sorted(Path(fixtures_dir).iterdir()):
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        mime = mimetypes.guess_type(path.name)[0] or 'image/jpeg'
+        data = path.read_bytes()
+        with Image.open(path) as image:
+            size = image.size
+        fixtures.append({
+            'name': path.name,
+            'data_url': f"data:{mime};base64,{base64.b64encode(data).decode()}",
+            'size': size
+        })
+    return fixtures
+
+
+def run_variant(fixtures, output_mode: str, image_detail: str, repeat: int, estimate_only: bool):
+    rows = []
+    for fixture in fixtures:
+        for _ in range(repeat):
+            if estimate_only:
+                rows.append({
+                    'fixture': fixture['name'],
+                    # ~4 characters per token is close enough to rank variants.
+                    'prompt_text_tokens': len(PROMPTS[output_mode]) // 4,
+                    'image_tokens': estimate_image_tokens(*fixture['size'], image_detail)
+                })
+                continue
+
+            try:
+                _, usage = ai_service.describe_image(
+                    fixture['data_url'], output_mode=output_mode, image_detail=image_detail
+                )
+                rows.append({'fixture': fixture['name'], **usage})
+            except Exception as e:
+                print(f"  ❌ {fixture['name']}: {e}")
+    return rows
+
+
+def summarize(rows, key):
+    values = [row[key] for row in rows if row.get(key) is not None]
+    return round(statistics.mean(values), 1) if values else None
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Benchmark AIService prompt variants.")
+    parser.add_argument("fixtures_dir", help="directory of product images")
+    parser.add_argument("--variants", default="text:auto,json:auto,json:low",
+                        help="comma-separated output_mode:image_detail pairs")
+    parser.add_argument("--repeat", type=int, default=1, help="calls per fixture per variant")
+    parser.add_argument("--estimate-only", action="store_true", help="estimate tokens without calling the API")
+    parser.add_argument("--output", help="write raw per-call results to this JSON file")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures_dir)
+    if not fixtures:
+        print(f"No images found in {args.fixtures_dir}")
+        return False
+
+    results = {}
+    for variant in (v.strip() for v in args.variants.split(',') if v.strip()):
+        output_mode, _, image_detail = variant.partition(':')
+        if output_mode not in PROMPTS or image_detail not in ('low', 'high', 'auto'):
+            print(f"Skipping unknown variant {variant}")
+            continue
+        print(f"🔧 Running {variant} on {len(fixtures)} fixtures")
+        results[variant] = run_variant(fixtures, output_mode, image_detail or 'auto', args.repeat, args.estimate_only)
+
+    print("=" * 78)
+    if args.estimate_only:
+        print(f"{'variant':<14}{'prompt text tok':>18}{'image tok (est)':>18}")
+        for variant, rows in results.items():
+            print(f"{variant:<14}{summarize(rows, 'prompt_text_tokens')!s:>18}{summarize(rows, 'image_tokens')!s:>18}")
+    else:
+        print(f"{'variant':<14}{'calls':>6}{'prompt tok':>12}{'image tok':>12}{'compl tok':>12}{'p50 ms':>10}{'p95 ms':>10}")
+        for variant, rows in results.items():
+            latencies = sorted(row['latency_ms'] for row in rows)
+            p50 = latencies[len(latencies) // 2] if latencies else None
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+            print(
+                f"{variant:<14}{len(rows):>6}{summarize(rows, 'prompt_tokens')!s:>12}"
+                f"{summarize(rows, 'image_tokens')!s:>12}{summarize(rows, 'completion_tokens')!s:>12}"
+                f"{p50!s:>10}{p95!s:>10}"
+            )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Raw results written to {args.output}")
+
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+One-off migration for the admin review queue: give pending products created
+before review leases existed an empty `lease_expires_at`, so the claim query
+(which filters on that field) can see them.
+
+Usage:
+    python backend/scripts/backfill_review_leases.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.services.firebase_service import firebase_service
+
+
+if __name__ == "__main__":
+    updated = firebase_service.backfill_review_lease_fields()
+    print(f"✅ Backfilled lease_expires_at on {updated} pending products")
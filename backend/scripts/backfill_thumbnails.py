@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Generate WebP variants for every live product whose thumbnail job is still
+'pending', e.g. jobs dropped from the in-process queue on a full queue,
+deploy or crash.
+
+Usage:
+    python backend/scripts/backfill_thumbnails.py [--retry-failed] [--migrate]
+
+--migrate stamps `thumbnail_status` on products created before it existed
+(run once after upgrading); --retry-failed also retries 'failed' jobs.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.services.firebase_service import firebase_service
+from app.services.image_hash_index import image_hash_index
+from app.services.thumbnail_service import thumbnail_service
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate missing product thumbnails")
+    parser.add_argument("--retry-failed", action="store_true", help="also retry products whose job failed")
+    parser.add_argument("--migrate", action="store_true", help="stamp thumbnail_status on older products first")
+    args = parser.parse_args()
+
+    if args.migrate:
+        stamped = firebase_service.backfill_thumbnail_status()
+        print(f"✅ Stamped thumbnail_status on {stamped} products")
+
+    # Duplicate detection for the recomputed hashes needs the current index.
+    image_hash_index.rebuild()
+
+    statuses = ('pending', 'failed') if args.retry_failed else ('pending',)
+    thumbnail_service.start()
+    try:
+        queued = thumbnail_service.backfill(statuses)
+        thumbnail_service.join()
+    finally:
+        thumbnail_service.stop()
+    print(f"✅ Processed {queued} products")
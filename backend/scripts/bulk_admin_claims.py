@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Grant or revoke the admin claim for many users at once.
+
+Reads a CSV of emails and/or uids (an `email` or `uid` column, or one value
+per line), resolves them 100 at a time with `auth.get_users`, then applies
+the claim from a bounded thread pool under a shared rate limit.
+
+Usage:
+    python backend/scripts/bulk_admin_claims.py users.csv [--revoke] [--dry-run]
+        [--concurrency 8] [--rate 50]
+"""
+
+import argparse
+import csv
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import firebase_admin
+from firebase_admin import auth, exceptions
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.middleware.admission import TokenBucket
+from app.services.firebase_service import firebase_service
+
+GET_USERS_BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+
+
+def read_identifiers(csv_path: str):
+    """Return (emails, uids) from the CSV, de-duplicated and in file order."""
+    emails, uids = {}, {}
+
+    with open(csv_path, newline='') as f:
+        rows = list(csv.reader(f))
+
+    if not rows:
+        return [], []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    columns = [i for i, name in enumerate(header) if name in ('email', 'uid')]
+    if columns:
+        rows = rows[1:]
+
+    for row in rows:
+        cells = [row[i] for i in columns if i < len(row)] if columns else row[:1]
+        for value in (cell.strip() for cell in cells):
+            if not value:
+                continue
+            if '@' in value:
+                emails[value.lower()] = None
+            else:
+                uids[value] = None
+
+    return list(emails), list(uids)
+
+
+def throttled(bucket: TokenBucket, fn, *args):
+    """Call `fn` under the shared rate limit, backing off when the Admin SDK pushes back."""
+    for attempt in range(MAX_ATTEMPTS):
+        while (wait := bucket.try_consume()) > 0:
+            time.sleep(wait)
+        try:
+            return fn(*args)
+        except (exceptions.ResourceExhaustedError, exceptions.UnavailableError):
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(min(30, 2 ** attempt))
+
+
+def resolve_users(emails, uids, bucket: TokenBucket):
+    identifiers = [auth.EmailIdentifier(e) for e in emails] + [auth.UidIdentifier(u) for u in uids]
+    users, not_found = {}, []
+
+    for start in range(0, len(identifiers), GET_USERS_BATCH_SIZE):
+        result = throttled(bucket, auth.get_users, identifiers[start:start + GET_USERS_BATCH_SIZE])
+        for user in result.users:
+            users[user.uid] = user
+        for identifier in result.not_found:
+            not_found.append(getattr(identifier, 'email', None) or getattr(identifier, 'uid', None))
+
+    return list(users.values()), not_found
+
+
+def apply_claims(users, is_admin: bool, dry_run: bool, concurrency: int, bucket: TokenBucket):
+    summary = {'updated': 0, 'unchanged': 0, 'failed': 0}
+    failures = []
+
+    pending = []
+    for user in users:
+        claims = dict(user.custom_claims or {})
+        if claims.get('admin', False) == is_admin:
+            summary['unchanged'] += 1
+            continue
+        claims['admin'] = is_admin
+        pending.append((user, claims))
+
+    if dry_run:
+        for user, _ in pending:
+            print(f"[dry run] would {'grant' if is_admin else 'revoke'} admin for {user.email or user.uid}")
+        summary['updated'] = len(pending)
+        return summary, failures
+
+    def apply(item):
+        user, claims = item
+        try:
+            # Keep any other custom claims the user already has.
+            throttled(bucket, auth.set_custom_user_claims, user.uid, claims)
+            return user, None
+        except Exception as e:
+            return user, e
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for user, error in executor.map(apply, pending):
+            if error is None:
+                summary['updated'] += 1
+            else:
+                summary['failed'] += 1
+                failures.append((user.email or user.uid, error))
+
+    return summary, failures
+
+
+def main(argv=None) -> bool:
+    parser = argparse.ArgumentParser(description="Bulk grant or revoke the admin custom claim.")
+    parser.add_argument("csv_path", help="CSV with an email/uid column, or one email or uid per line")
+    parser.add_argument("--revoke", action="store_true", help="remove the admin claim instead of granting it")
+    parser.add_argument("--dry-run", action="store_true", help="resolve users and report changes without writing")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel claim updates (default: 8)")
+    parser.add_argument("--rate", type=float, default=50, help="max Admin SDK calls per second (default: 50)")
+    args = parser.parse_args(argv)
+
+    if not firebase_admin._apps:
+        firebase_service._initialize_firebase()
+
+    started = time.monotonic()
+    bucket = TokenBucket(rate=args.rate, capacity=max(1.0, args.rate))
+
+    emails, uids = read_identifiers(args.csv_path)
+    print(f"🔧 Resolving {len(emails)} emails and {len(uids)} uids")
+    users, not_found = resolve_users(emails, uids, bucket)
+
+    summary, failures = apply_claims(users, not args.revoke, args.dry_run, args.concurrency, bucket)
+
+    print("=" * 50)
+    print(f"{'Would update' if args.dry_run else 'Updated'}: {summary['updated']}")
+    print(f"Unchanged: {summary['unchanged']}")
+    print(f"Not found: {len(not_found)}")
+    print(f"Failed: {summary['failed']}")
+    for identifier in not_found:
+        print(f"  ❌ not found: {identifier}")
+    for identifier, error in failures:
+        print(f"  ❌ {identifier}: {error}")
+    print(f"Finished in {time.monotonic() - started:.1f}s")
+    if summary['updated'] and not args.dry_run:
+        print("\nNote: Users must log out and log back in for the change to take effect.")
+
+    return not failures
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
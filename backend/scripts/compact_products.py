@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Move soft-deleted and long-rejected products out of `products` into
+`products_archive`, keeping the live collection small.
+
+The job works in batches, is rate limited, and records its progress in a
+checkpoint file so an interrupted run picks up where it stopped.
+
+Usage:
+    python backend/scripts/compact_products.py [--rejected-older-than-days 90]
+        [--batch-size 100] [--rate 50] [--checkpoint PATH] [--dry-run] [--reset]
+    python backend/scripts/compact_products.py --restore <product_id> [--undelete]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.middleware.admission import TokenBucket
+from app.services.firebase_service import firebase_service
+
+PHASES = ('deleted', 'rejected')
+
+
+def load_checkpoint(path: str, rejected_days: int) -> dict:
+    if os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        print(f"Resuming from checkpoint {path}: phase={checkpoint['phase']} after={checkpoint['start_after']}")
+        return checkpoint
+
+    return {
+        'phase': PHASES[0],
+        'start_after': None,
+        # Fixed for the whole run so a resumed job archives the same set.
+        'rejected_before': (datetime.utcnow() - timedelta(days=rejected_days)).isoformat(),
+        'archived': {phase: 0 for phase in PHASES},
+        'started_at': datetime.utcnow().isoformat()
+    }
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compact(args) -> bool:
+    checkpoint = load_checkpoint(args.checkpoint, args.rejected_older_than_days)
+    bucket = TokenBucket(rate=args.rate, capacity=max(args.rate, args.batch_size))
+    phases = PHASES if args.rejected_older_than_days > 0 else PHASES[:1]
+
+    for phase in phases[phases.index(checkpoint['phase']) if checkpoint['phase'] in phases else 0:]:
+        if checkpoint['phase'] != phase:
+            checkpoint.update({'phase': phase, 'start_after': None})
+
+        while True:
+            docs, last_id = firebase_service.get_archive_candidates(
+                phase,
+                args.batch_size,
+                start_after=checkpoint['start_after'],
+                rejected_before=checkpoint['rejected_before']
+            )
+            if last_id is None:
+                break
+
+            while (wait := bucket.try_consume(len(docs))) > 0:
+                time.sleep(wait)
+
+            if args.dry_run:
+                for doc in docs:
+                    print(f"[dry run] would archive {doc.id} ({phase})")
+                archived = len(docs)
+            else:
+                archived = firebase_service.archive_products(docs, phase)
+
+            checkpoint['archived'][phase] += archived
+            checkpoint['start_after'] = last_id
+            if not args.dry_run:
+                save_checkpoint(args.checkpoint, checkpoint)
+            print(f"{phase}: {'would archive' if args.dry_run else 'archived'} {archived} (total {checkpoint['archived'][phase]})")
+
+    print("=" * 50)
+    for phase in phases:
+        print(f"{'Would archive' if args.dry_run else 'Archived'} {phase}: {checkpoint['archived'][phase]}")
+
+    # A completed run starts fresh next time.
+    if not args.dry_run and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    return True
+
+
+def restore(args) -> bool:
+    if firebase_service.restore_product(args.restore, undelete=args.undelete):
+        print(f"✅ Restored product {args.restore}")
+        return True
+    print(f"❌ Product {args.restore} not found in products_archive")
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive soft-deleted and old rejected products.")
+    parser.add_argument("--rejected-older-than-days", type=int, default=90,
+                        help="archive rejected products not updated for this many days (0 disables)")
+    parser.add_argument("--batch-size", type=int, default=100, help="documents read per page (default: 100)")
+    parser.add_argument("--rate", type=float, default=50, help="max documents archived per second (default: 50)")
+    parser.add_argument("--checkpoint", default=".compaction_checkpoint.json", help="checkpoint file path")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be archived without writing")
+    parser.add_argument("--reset", action="store_true", help="ignore any existing checkpoint")
+    parser.add_argument("--restore", metavar="PRODUCT_ID", help="move an archived product back into products")
+    parser.add_argument("--undelete", action="store_true", help="with --restore, also clear is_deleted")
+    args = parser.parse_args()
+
+    if args.restore:
+        sys.exit(0 if restore(args) else 1)
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    sys.exit(0 if compact(args) else 1)
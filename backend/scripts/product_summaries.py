@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Rebuild or verify the denormalized user_product_summaries/{uid}/items documents.
+
+Usage:
+    python backend/scripts/product_summaries.py rebuild [<user_uid> ...]
+    python backend/scripts/product_summaries.py check [<user_uid> ...]
+
+Without uids, every user that owns at least one product is processed.
+`check` exits non-zero if any summary is out of sync with `products`.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.services.firebase_service import firebase_service
+
+
+def rebuild(user_ids):
+    for uid in user_ids:
+        entries = firebase_service.rebuild_user_product_summary(uid)
+        print(f"✅ Rebuilt summary for {uid} ({len(entries)} products)")
+    return True
+
+
+def check(user_ids):
+    consistent = True
+    for uid in user_ids:
+        report = firebase_service.check_user_product_summary(uid)
+        if any(report.values()):
+            consistent = False
+            print(f"❌ {uid}: missing={report['missing']} extra={report['extra']} stale={report['stale']}")
+        else:
+            print(f"✅ {uid}: consistent")
+    return consistent
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("rebuild", "check"):
+        print("Usage: python product_summaries.py (rebuild|check) [<user_uid> ...]")
+        sys.exit(1)
+
+    user_ids = sys.argv[2:] or firebase_service.get_product_owner_ids()
+    action = rebuild if sys.argv[1] == "rebuild" else check
+    sys.exit(0 if action(user_ids) else 1)
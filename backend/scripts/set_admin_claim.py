@@ -5,6 +5,7 @@ This should be run server-side with proper Firebase Admin credentials.
 
 Usage:
     python backend/scripts/set_admin_claim.py <user_uid>
+    python backend/scripts/set_admin_claim.py --csv <users.csv> [--revoke] [--dry-run]
 """
 
 import sys
@@ -50,8 +51,13 @@ def set_admin_claim(uid: str):
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--csv":
+        from scripts.bulk_admin_claims import main
+        sys.exit(0 if main(sys.argv[2:]) else 1)
+    
     if len(sys.argv) != 2:
         print("Usage: python set_admin_claim.py <user_uid>")
+        print("       python set_admin_claim.py --csv <users.csv> [--revoke] [--dry-run]")
         print("\nTo find user UID:")
         print("1. Go to Firebase Console > Authentication > Users")
         print("2. Find the user and copy their UID")
@@ -0,0 +1,23 @@
+import time
+
+import pytest
+
+
+class FakeClock:
+    """Stand-in for time.monotonic that only moves when a test advances it."""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake)
+    return fake
@@ -0,0 +1,146 @@
+import asyncio
+import math
+
+import pytest
+from fastapi import HTTPException
+
+from app.middleware.admission import AdaptiveConcurrencyLimiter, TokenBucket, admission_controller
+
+
+class TestTokenBucket:
+    def test_allows_burst_up_to_capacity(self, clock):
+        bucket = TokenBucket(rate=1.0, capacity=3)
+
+        assert [bucket.try_consume() for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert bucket.try_consume() == pytest.approx(1.0)
+
+    def test_refills_over_time(self, clock):
+        bucket = TokenBucket(rate=2.0, capacity=2)
+        bucket.try_consume()
+        bucket.try_consume()
+
+        assert bucket.try_consume() == pytest.approx(0.5)
+        clock.advance(0.5)
+        assert bucket.try_consume() == 0.0
+
+    def test_refill_is_capped_at_capacity(self, clock):
+        bucket = TokenBucket(rate=10.0, capacity=2)
+        bucket.try_consume()
+        assert not bucket.is_full()
+
+        clock.advance(60)
+        assert bucket.is_full()
+        assert [bucket.try_consume() for _ in range(3)][-1] > 0
+
+    def test_refund_returns_tokens_up_to_capacity(self, clock):
+        bucket = TokenBucket(rate=0.0, capacity=2)
+        bucket.try_consume()
+        bucket.try_consume()
+
+        bucket.refund()
+        bucket.refund()
+        bucket.refund()
+
+        assert bucket.is_full()
+        assert [bucket.try_consume() for _ in range(3)] == [0.0, 0.0, math.inf]
+
+    def test_zero_rate_never_refills(self, clock):
+        bucket = TokenBucket(rate=0.0, capacity=1)
+        bucket.try_consume()
+
+        assert bucket.try_consume() == math.inf
+
+
+class TestAdaptiveConcurrencyLimiter:
+    def make(self, **overrides):
+        settings = {"initial_limit": 4, "min_limit": 1, "max_limit": 8, "target_latency": 1.0}
+        settings.update(overrides)
+        return AdaptiveConcurrencyLimiter(**settings)
+
+    def test_rejects_beyond_limit(self):
+        limiter = self.make(initial_limit=2)
+
+        assert limiter.try_acquire()
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+        assert limiter.snapshot()["rejected"] == 1
+
+    def test_fast_successes_raise_limit_additively(self):
+        limiter = self.make()
+
+        # +1/limit per success: one full window of 4 fast calls adds about one slot.
+        for _ in range(5):
+            limiter.try_acquire()
+            limiter.release(latency=0.1, success=True)
+
+        assert limiter.limit == 5
+
+    def test_limit_never_exceeds_max(self):
+        limiter = self.make(initial_limit=7, max_limit=8)
+
+        for _ in range(100):
+            limiter.try_acquire()
+            limiter.release(latency=0.1, success=True)
+
+        assert limiter.limit == 8
+
+    def test_slow_call_backs_off_multiplicatively(self):
+        limiter = self.make(initial_limit=8)
+        limiter.try_acquire()
+        limiter.release(latency=5.0, success=True)
+
+        assert limiter.limit == 7  # 8 * 0.9
+
+    def test_failure_backs_off_even_when_fast(self):
+        limiter = self.make(initial_limit=8)
+        limiter.try_acquire()
+        limiter.release(latency=0.1, success=False)
+
+        assert limiter.limit == 7
+
+    def test_limit_never_drops_below_min(self):
+        limiter = self.make(initial_limit=2, min_limit=1)
+
+        for _ in range(50):
+            limiter.try_acquire()
+            limiter.release(latency=0.1, success=False)
+
+        assert limiter.limit == 1
+        assert limiter.try_acquire()
+
+    def test_release_frees_a_slot(self):
+        limiter = self.make(initial_limit=1)
+        limiter.try_acquire()
+        assert not limiter.try_acquire()
+
+        limiter.release(latency=0.1, success=True)
+
+        assert limiter.try_acquire()
+
+
+def test_request_shed_for_saturation_keeps_user_quota(monkeypatch):
+    for name, value in {
+        "MAX_CONCURRENCY": "1", "INITIAL_CONCURRENCY": "1",
+        "USER_RATE_PER_MIN": "0.001", "USER_BURST": "2"
+    }.items():
+        monkeypatch.setenv(f"ADMISSION_SHED_TEST_{name}", value)
+    dependency = admission_controller.limit("shed-test")
+    user = {"uid": "user-1"}
+
+    async def scenario():
+        first = dependency(current_user=user)
+        await first.__anext__()
+
+        shed = dependency(current_user=user)
+        with pytest.raises(HTTPException) as error:
+            await shed.__anext__()
+        assert error.value.status_code == 503
+
+        await first.aclose()
+
+        # The shed request's token was refunded, so the user still has quota.
+        retry = dependency(current_user=user)
+        assert await retry.__anext__() == user
+        await retry.aclose()
+
+    asyncio.run(scenario())
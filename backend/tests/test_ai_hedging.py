@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import deque
+
+import pytest
+
+from app.services.ai_service import ai_service
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    """Enable hedging at p50 with a 20 ms latency history."""
+    monkeypatch.setattr(ai_service, "hedge_percentile", 50.0)
+    monkeypatch.setattr(ai_service, "_latencies", deque([0.02] * 20, maxlen=200))
+    monkeypatch.setattr(ai_service, "_counters", dict(ai_service._counters, hedged_requests=0))
+    return ai_service
+
+
+def test_no_hedge_without_latency_history(monkeypatch):
+    monkeypatch.setattr(ai_service, "hedge_percentile", 95.0)
+    monkeypatch.setattr(ai_service, "_latencies", deque(maxlen=200))
+    calls = []
+
+    assert ai_service._hedged_call(lambda timeout: calls.append(timeout) or "ok", timeout=5) == "ok"
+    assert calls == [5]
+
+
+def test_slow_request_is_hedged_and_faster_copy_wins(hedging):
+    release_first = threading.Event()
+    calls = []
+    lock = threading.Lock()
+
+    def request_fn(timeout):
+        with lock:
+            calls.append(timeout)
+            attempt = len(calls)
+        if attempt == 1:
+            release_first.wait(2)
+            return "slow"
+        return "fast"
+
+    try:
+        assert hedging._hedged_call(request_fn, timeout=2) == "fast"
+    finally:
+        release_first.set()
+
+    assert len(calls) == 2
+    assert hedging._counters["hedged_requests"] == 1
+
+
+def test_fast_request_is_not_hedged(hedging):
+    calls = []
+
+    assert hedging._hedged_call(lambda timeout: calls.append(timeout) or "ok", timeout=2) == "ok"
+    assert len(calls) == 1
+    assert hedging._counters["hedged_requests"] == 0
+
+
+def test_error_from_both_copies_is_raised(hedging):
+    def request_fn(timeout):
+        time.sleep(0.05)
+        raise ConnectionError("upstream down")
+
+    with pytest.raises(ConnectionError):
+        hedging._hedged_call(request_fn, timeout=2)
+
+
+def test_saturated_pool_runs_inline_without_hedging(hedging, monkeypatch):
+    monkeypatch.setattr(hedging, "_executor_in_flight", hedging.hedge_workers)
+    threads = []
+
+    def request_fn(timeout):
+        threads.append(threading.current_thread())
+        return "ok"
+
+    assert hedging._hedged_call(request_fn, timeout=2) == "ok"
+    assert threads == [threading.current_thread()]
+    assert hedging._counters["hedged_requests"] == 0
+
+
+def test_hedge_is_skipped_when_no_worker_is_free(hedging, monkeypatch):
+    monkeypatch.setattr(hedging, "_executor_in_flight", hedging.hedge_workers - 1)
+    calls = []
+
+    def request_fn(timeout):
+        calls.append(timeout)
+        time.sleep(0.1)
+        return "slow"
+
+    assert hedging._hedged_call(request_fn, timeout=2) == "slow"
+    assert len(calls) == 1
+    assert hedging._counters["hedged_requests"] == 0
+
+    # The worker is handed back by a done-callback that may trail the result.
+    for _ in range(100):
+        if hedging._executor_in_flight == hedging.hedge_workers - 1:
+            break
+        time.sleep(0.01)
+    assert hedging._executor_in_flight == hedging.hedge_workers - 1
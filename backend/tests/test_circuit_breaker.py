@@ -0,0 +1,75 @@
+from app.services.circuit_breaker import CircuitBreaker
+
+
+def open_breaker(clock, threshold=3, reset_timeout=30.0):
+    breaker = CircuitBreaker(failure_threshold=threshold, reset_timeout=reset_timeout)
+    for _ in range(threshold):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    return breaker
+
+
+def test_stays_closed_below_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_opens_after_threshold_and_rejects(clock):
+    breaker = open_breaker(clock)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.snapshot()["times_opened"] == 1
+
+
+def test_half_opens_after_reset_timeout_with_single_probe(clock):
+    breaker = open_breaker(clock, reset_timeout=30.0)
+
+    clock.advance(29)
+    assert not breaker.allow_request()
+
+    clock.advance(1)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_successful_probe_closes(clock):
+    breaker = open_breaker(clock)
+    clock.advance(30)
+    assert breaker.allow_request()
+
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens_for_another_timeout(clock):
+    breaker = open_breaker(clock)
+    clock.advance(30)
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.snapshot()["times_opened"] == 2
+
+    clock.advance(30)
+    assert breaker.allow_request()
@@ -0,0 +1,110 @@
+import pytest
+
+from app.services.idempotency import idempotency_store
+
+
+@pytest.fixture
+def store(monkeypatch, clock):
+    monkeypatch.setattr(idempotency_store, "_entries", {})
+    monkeypatch.setattr(idempotency_store, "ttl", 60.0)
+    monkeypatch.setattr(idempotency_store, "max_entries", 100)
+    return idempotency_store
+
+
+def begin(store, key="key-1", payload=None):
+    scope = store.scope("user-1", "POST", "/products/", key)
+    return scope, store.begin(scope, store.fingerprint(payload or {"title": "Lamp"}))
+
+
+def test_first_request_is_new(store):
+    _, (state, body) = begin(store)
+
+    assert state == store.NEW
+    assert body is None
+
+
+def test_retry_while_running_is_in_progress(store):
+    begin(store)
+    _, (state, _) = begin(store)
+
+    assert state == store.IN_PROGRESS
+
+
+def test_retry_after_success_replays_body(store):
+    scope, _ = begin(store)
+    store.complete(scope, {"id": "p1"})
+
+    _, (state, body) = begin(store)
+
+    assert state == store.REPLAY
+    assert body == {"id": "p1"}
+
+
+def test_same_key_with_different_body_is_mismatch(store):
+    scope, _ = begin(store)
+    store.complete(scope, {"id": "p1"})
+
+    _, (state, _) = begin(store, payload={"title": "Chair"})
+
+    assert state == store.MISMATCH
+
+
+def test_fingerprint_ignores_key_order(store):
+    assert store.fingerprint({"a": 1, "b": 2}) == store.fingerprint({"b": 2, "a": 1})
+
+
+def test_abandoned_key_can_be_retried(store):
+    scope, _ = begin(store)
+    store.abandon(scope)
+
+    _, (state, _) = begin(store)
+
+    assert state == store.NEW
+
+
+def test_abandon_keeps_completed_result(store):
+    scope, _ = begin(store)
+    store.complete(scope, {"id": "p1"})
+    store.abandon(scope)
+
+    _, (state, _) = begin(store)
+
+    assert state == store.REPLAY
+
+
+def test_keys_are_scoped_per_user(store):
+    begin(store)
+    other = store.scope("user-2", "POST", "/products/", "key-1")
+
+    state, _ = store.begin(other, store.fingerprint({"title": "Lamp"}))
+
+    assert state == store.NEW
+
+
+def test_entries_expire_after_ttl(store, clock):
+    scope, _ = begin(store)
+    store.complete(scope, {"id": "p1"})
+
+    clock.advance(61)
+    _, (state, _) = begin(store)
+
+    assert state == store.NEW
+
+
+def test_oldest_entries_are_evicted_when_full(store, monkeypatch):
+    monkeypatch.setattr(store, "max_entries", 2)
+    first, _ = begin(store, key="a")
+    store.complete(first, {"id": "a"})
+    begin(store, key="b")
+    begin(store, key="c")
+
+    _, (state, _) = begin(store, key="a")
+
+    assert state == store.NEW
+
+
+def test_complete_and_abandon_without_key_are_noops(store):
+    store.complete(None, {"id": "p1"})
+    store.abandon(None)
+
+    assert store._entries == {}
@@ -0,0 +1,136 @@
+import random
+import threading
+
+import pytest
+
+from app.services import image_hash_index as index_module
+from app.services.image_hash_index import BKTree, format_hash, image_hash_index, parse_hash
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeProducts:
+    """Just enough of firebase_service for the index: a products query and get_products."""
+
+    def __init__(self, docs, stream_gate=None):
+        self.docs = docs
+        self.stream_gate = stream_gate
+        self.streaming = threading.Event()
+        self.db = self
+
+    def collection(self, name):
+        return self
+
+    def where(self, *args):
+        return self
+
+    def select(self, fields):
+        return self
+
+    def stream(self):
+        self.streaming.set()
+        for i, doc in enumerate(self.docs):
+            if i == 1 and self.stream_gate is not None:
+                self.stream_gate.wait(5)
+            yield doc
+
+    def get_products(self, product_ids, fields=None):
+        by_id = {doc.id: doc.to_dict() for doc in self.docs}
+        return {product_id: by_id.get(product_id) for product_id in product_ids}
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(image_hash_index, "_tree", BKTree())
+    monkeypatch.setattr(image_hash_index, "_current", {})
+    monkeypatch.setattr(image_hash_index, "max_distance", 6)
+    return image_hash_index
+
+
+def product(image_hash, user_id="seller", status="pending"):
+    return {"image_hash": image_hash, "user_id": user_id, "status": status, "is_deleted": False}
+
+
+def test_hash_round_trip():
+    assert parse_hash(format_hash(0xABC)) == 0xABC
+    assert parse_hash("not-hex") is None
+    assert parse_hash(None) is None
+
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(7)
+    base = [rng.getrandbits(64) for _ in range(40)]
+    # Near-copies of a few base hashes, so there are matches at small distances.
+    values = base + [b ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for b in base[:20]]
+
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, f"p{i}")
+
+    for query in values[:10] + [rng.getrandbits(64) for _ in range(10)]:
+        for max_distance in (0, 3, 6, 20):
+            expected = {
+                (bin(query ^ value).count("1"), value, f"p{i}")
+                for i, value in enumerate(values)
+                if bin(query ^ value).count("1") <= max_distance
+            }
+            assert set(tree.search(query, max_distance)) == expected
+
+
+def test_find_ignores_replaced_and_discarded_entries(index):
+    index.add("a", "seller", "00000000000000ff")
+    index.add("b", "seller", "00000000000000fe")
+    index.add("a", "seller", "ffffffffffffffff")
+    index.discard("b")
+
+    assert index.find("00000000000000ff") == []
+    assert index.find("ffffffffffffffff") == ["a"]
+
+
+def test_find_filters_by_user_and_sorts_by_distance(index):
+    index.add("far", "seller", "000000000000003f")
+    index.add("near", "seller", "0000000000000001")
+    index.add("other", "someone-else", "0000000000000000")
+
+    assert index.find("0000000000000000") == ["other", "near", "far"]
+    assert index.find("0000000000000000", user_id="seller") == ["near", "far"]
+
+
+def test_rebuild_keeps_changes_made_while_streaming(index, monkeypatch):
+    gate = threading.Event()
+    fake = FakeProducts([
+        FakeDoc("a", product("00000000000000ff")),
+        FakeDoc("b", product("00000000000000f0")),
+        FakeDoc("rejected", product("00000000000000f1", status="rejected")),
+    ], stream_gate=gate)
+    monkeypatch.setattr(index_module, "firebase_service", fake)
+
+    rebuild = threading.Thread(target=index.rebuild)
+    rebuild.start()
+    assert fake.streaming.wait(5)
+    index.add("c", "seller", "00000000000000fe")
+    index.discard("b")
+    gate.set()
+    rebuild.join(5)
+
+    assert sorted(index.find("00000000000000ff", limit=10)) == ["a", "c"]
+
+
+def test_find_live_discards_products_gone_from_firestore(index, monkeypatch):
+    index.add("live", "seller", "0000000000000000")
+    index.add("archived", "seller", "0000000000000001")
+    index.add("rejected", "seller", "0000000000000003")
+    monkeypatch.setattr(index_module, "firebase_service", FakeProducts([
+        FakeDoc("live", product("0000000000000000")),
+        FakeDoc("rejected", product("0000000000000003", status="rejected")),
+    ]))
+
+    assert index.find_live("0000000000000000") == ["live"]
+    assert index.find("0000000000000000") == ["live"]
@@ -0,0 +1,114 @@
+import pytest
+
+from app.services import write_buffer as write_buffer_module
+from app.services.write_buffer import write_buffer
+
+
+class FakeFirebase:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.writes = []
+
+    def update_product(self, product_id, update_data):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Firestore unavailable")
+        self.writes.append((product_id, update_data))
+        return True
+
+
+@pytest.fixture
+def buffer(monkeypatch, clock):
+    monkeypatch.setattr(write_buffer, "window", 0.5)
+    monkeypatch.setattr(write_buffer, "_pending", {})
+    monkeypatch.setattr(write_buffer, "_due", {})
+    monkeypatch.setattr(write_buffer, "_attempts", {})
+    # Running without the flusher thread: tests drive flush() themselves.
+    monkeypatch.setattr(write_buffer, "_running", True)
+    return write_buffer
+
+
+def use_firebase(monkeypatch, failures=0):
+    fake = FakeFirebase(failures)
+    monkeypatch.setattr(write_buffer_module, "firebase_service", fake)
+    return fake
+
+
+def test_updates_in_window_are_merged_newest_wins(buffer, monkeypatch):
+    firebase = use_firebase(monkeypatch)
+    buffer.submit("p1", {"title": "Old", "description": "Desc"})
+    buffer.submit("p1", {"title": "New"})
+
+    assert buffer.pending("p1") == {"title": "New", "description": "Desc"}
+
+    buffer.flush()
+
+    assert firebase.writes == [("p1", {"title": "New", "description": "Desc"})]
+    assert buffer.pending("p1") is None
+
+
+def test_products_are_written_separately(buffer, monkeypatch):
+    firebase = use_firebase(monkeypatch)
+    buffer.submit("p1", {"title": "One"})
+    buffer.submit("p2", {"title": "Two"})
+
+    buffer.flush()
+
+    assert sorted(firebase.writes) == [("p1", {"title": "One"}), ("p2", {"title": "Two"})]
+
+
+def test_take_only_returns_due_updates(buffer, clock):
+    buffer.submit("p1", {"title": "One"})
+    clock.advance(0.3)
+    buffer.submit("p2", {"title": "Two"})
+    clock.advance(0.3)
+
+    assert list(buffer._take(clock())) == ["p1"]
+    assert buffer.pending("p2") == {"title": "Two"}
+
+
+def test_failed_write_is_requeued_under_newer_fields(buffer, monkeypatch):
+    firebase = use_firebase(monkeypatch, failures=1)
+    buffer.submit("p1", {"title": "Old", "description": "Desc"})
+    buffer.flush()
+
+    assert firebase.writes == []
+    assert buffer.pending("p1") == {"title": "Old", "description": "Desc"}
+
+    buffer.submit("p1", {"title": "New"})
+    buffer.flush()
+
+    assert firebase.writes == [("p1", {"title": "New", "description": "Desc"})]
+
+
+def test_failed_write_keeps_fields_submitted_during_the_write(buffer, monkeypatch):
+    use_firebase(monkeypatch, failures=1)
+    buffer.submit("p1", {"title": "Old", "description": "Desc"})
+    taken = buffer._take(None)
+    # A newer update lands while the failing write is in flight.
+    buffer.submit("p1", {"title": "New"})
+
+    buffer._write(taken)
+
+    assert buffer.pending("p1") == {"title": "New", "description": "Desc"}
+
+
+def test_update_is_dropped_after_max_attempts(buffer, monkeypatch):
+    firebase = use_firebase(monkeypatch, failures=buffer.MAX_ATTEMPTS)
+    buffer.submit("p1", {"title": "Lamp"})
+
+    for _ in range(buffer.MAX_ATTEMPTS):
+        buffer.flush()
+
+    assert buffer.pending("p1") is None
+    assert firebase.writes == []
+
+
+def test_failed_write_is_not_requeued_once_stopped(buffer, monkeypatch):
+    use_firebase(monkeypatch, failures=1)
+    monkeypatch.setattr(buffer, "_running", False)
+    buffer.submit("p1", {"title": "Lamp"})
+
+    buffer.flush()
+
+    assert buffer.pending("p1") is None
@@ -2,6 +2,7 @@
 
 import { useState } from 'react';
 import { Product } from '@/types';
+import { imageSrcSet } from '@/lib/utils';
 import { Card, CardContent, CardFooter, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { updateProductStatus } from '@/lib/api';
@@ -35,13 +36,21 @@ export default function AdminReviewCard({ product, onStatusChange }: AdminReview
     <Card className="overflow-hidden">
       <div className="relative h-48 w-full bg-gray-100">
         <img
-          src={product.image_url}
+          src={product.thumbnail_url || product.image_url}
+          srcSet={imageSrcSet(product)}
+          sizes="(min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw"
+          loading="lazy"
           alt={product.title}
           className="object-cover w-full h-full"
         />
       </div>
       <CardHeader>
         <CardTitle className="text-lg">{product.title}</CardTitle>
+        {product.duplicate_of && product.duplicate_of.length > 0 && (
+          <p className="text-xs font-medium text-amber-700">
+            Possible duplicate of {product.duplicate_of.length} existing listing{product.duplicate_of.length > 1 ? 's' : ''}
+          </p>
+        )}
       </CardHeader>
       <CardContent className="space-y-2">
         <p className="text-sm text-muted-foreground">
@@ -2,6 +2,7 @@
 
 import { useState } from 'react';
 import { Product } from '@/types';
+import { imageSrcSet } from '@/lib/utils';
 import { Card, CardContent, CardFooter, CardHeader, CardTitle } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
 import { Button } from '@/components/ui/button';
@@ -72,7 +73,10 @@ export default function ListingCard({ product, onDelete }: ListingCardProps) {
     <Card className="overflow-hidden hover:shadow-xl transition-all duration-300 group">
       <div className="relative h-52 w-full bg-gradient-to-br from-gray-100 to-gray-200 overflow-hidden">
         <img
-          src={product.image_url}
+          src={product.thumbnail_url || product.image_url}
+          srcSet={imageSrcSet(product)}
+          sizes="(min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw"
+          loading="lazy"
           alt={product.title}
           className="object-cover w-full h-full group-hover:scale-110 transition-transform duration-500"
         />
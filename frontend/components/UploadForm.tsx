@@ -23,6 +23,24 @@ export default function UploadForm({ onSuccess }: { onSuccess?: () => void }) {
   const [loading, setLoading] = useState(false);
   const [uploadProgress, setUploadProgress] = useState(0);
   const [aiGenerating, setAiGenerating] = useState(false);
+  const [uploaded, setUploaded] = useState<{ file: File; path: string; url: string } | null>(null);
+  const [imageHash, setImageHash] = useState<string | null>(null);
+  // One key per listing: every retry of a failed submit reuses it, so a lost response can't create a duplicate.
+  const [submissionKey, setSubmissionKey] = useState(() => crypto.randomUUID());
+
+  // Upload each selected file once; AI generation and product creation both reuse it.
+  const ensureUploaded = async (file: File) => {
+    if (uploaded && uploaded.file === file) {
+      return uploaded;
+    }
+    const path = `products/${user!.uid}/${Date.now()}_${file.name}`;
+    const storageRef = ref(storage, path);
+    await uploadBytes(storageRef, file);
+    const url = await getDownloadURL(storageRef);
+    const result = { file, path, url };
+    setUploaded(result);
+    return result;
+  };
 
   const handleImageChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
@@ -33,6 +51,7 @@ export default function UploadForm({ onSuccess }: { onSuccess?: () => void }) {
       }
       
       setImageFile(file);
+      setImageHash(null);
       const reader = new FileReader();
       reader.onloadend = () => {
         setImagePreview(reader.result as string);
@@ -59,44 +78,49 @@ export default function UploadForm({ onSuccess }: { onSuccess?: () => void }) {
     const toastId = toast.loading('AI is analyzing your product image...');
 
     try {
-      const reader = new FileReader();
-      reader.onloadend = async () => {
-        try {
-          const base64Image = reader.result as string;
-          const result = await generateAIDescription(base64Image);
-          
-          setTitle(result.title);
-          setDescription(result.description);
-          if (result.keywords) {
-            setKeywords(result.keywords.join(', '));
-          }
-          
-          toast.success('AI description generated!', {
-            id: toastId,
-            description: 'Your product details have been filled automatically',
-            icon: <Sparkles className="h-4 w-4" />,
-          });
-        } catch (err: any) {
-          console.error('AI generation error:', err);
-          
-          if (err.response?.status === 401) {
-            toast.error('Authentication required', {
-              id: toastId,
-              description: 'Please sign in again to use AI features',
-            });
-          } else {
-            toast.error('AI generation failed', {
-              id: toastId,
-              description: err.response?.data?.detail || 'Could not analyze the image. Please try again.',
-            });
-          }
-        } finally {
-          setAiGenerating(false);
-        }
-      };
-      reader.readAsDataURL(imageFile);
-    } catch (err) {
-      toast.error('Failed to read image', { id: toastId });
+      const { path } = await ensureUploaded(imageFile);
+      const result = await generateAIDescription({ storage_path: path });
+
+      if (result.degraded && !result.title) {
+        toast.warning('AI is temporarily unavailable', {
+          id: toastId,
+          description: 'Please enter the product details manually',
+        });
+        return;
+      }
+      
+      setImageHash(result.image_hash || null);
+      setTitle(result.title);
+      setDescription(result.description);
+      if (result.keywords) {
+        setKeywords(result.keywords.join(', '));
+      }
+      
+      toast.success('AI description generated!', {
+        id: toastId,
+        description: 'Your product details have been filled automatically',
+        icon: <Sparkles className="h-4 w-4" />,
+      });
+    } catch (err: any) {
+      console.error('AI generation error:', err);
+      
+      if (err.response?.status === 401) {
+        toast.error('Authentication required', {
+          id: toastId,
+          description: 'Please sign in again to use AI features',
+        });
+      } else if (err.code?.includes('storage')) {
+        toast.error('Storage error', {
+          id: toastId,
+          description: 'Failed to upload image. Please check Firebase Storage permissions.',
+        });
+      } else {
+        toast.error('AI generation failed', {
+          id: toastId,
+          description: err.response?.data?.detail || 'Could not analyze the image. Please try again.',
+        });
+      }
+    } finally {
       setAiGenerating(false);
     }
   };
@@ -126,14 +150,9 @@ export default function UploadForm({ onSuccess }: { onSuccess?: () => void }) {
 
     try {
       setUploadProgress(25);
-      const storageRef = ref(storage, `products/${user.uid}/${Date.now()}_${imageFile.name}`);
       
       toast.loading('Uploading image to storage...', { id: toastId });
-      await uploadBytes(storageRef, imageFile);
-      setUploadProgress(50);
-      
-      toast.loading('Getting image URL...', { id: toastId });
-      const imageUrl = await getDownloadURL(storageRef);
+      const { url: imageUrl } = await ensureUploaded(imageFile);
       setUploadProgress(75);
 
       const keywordsArray = keywords.split(',').map(k => k.trim()).filter(k => k);
@@ -145,7 +164,8 @@ export default function UploadForm({ onSuccess }: { onSuccess?: () => void }) {
         keywords: keywordsArray.length > 0 ? keywordsArray : undefined,
         image_url: imageUrl,
         user_id: user.uid,
-      });
+        image_hash: imageHash || undefined,
+      }, submissionKey);
       setUploadProgress(100);
 
       toast.success('Product created successfully!', {
@@ -159,6 +179,9 @@ export default function UploadForm({ onSuccess }: { onSuccess?: () => void }) {
       setKeywords('');
       setImageFile(null);
       setImagePreview('');
+      setUploaded(null);
+      setImageHash(null);
+      setSubmissionKey(crypto.randomUUID());
       setUploadProgress(0);
       
       if (onSuccess) {
@@ -19,10 +19,10 @@ apiClient.interceptors.request.use(async (config) => {
   return config;
 });
 
-export const generateAIDescription = async (imageData: string) => {
-  const response = await apiClient.post('/products/generate-ai-description', {
-    image_data: imageData,
-  });
+export const generateAIDescription = async (
+  source: { image_data: string } | { storage_path: string }
+) => {
+  const response = await apiClient.post('/products/generate-ai-description', source);
   return response.data;
 };
 
@@ -32,18 +32,34 @@ export const createProduct = async (productData: {
   keywords?: string[];
   image_url: string;
   user_id: string;
-}) => {
-  const response = await apiClient.post('/products/', productData);
+  image_hash?: string;
+}, idempotencyKey?: string) => {
+  // Reusing the key on retry lets the backend return the original result instead of creating a duplicate.
+  const headers = idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {};
+  const response = await apiClient.post('/products/', productData, { headers });
+  return response.data;
+};
+
+export const getMyProducts = async (fields?: string[]) => {
+  const params = fields ? { fields: fields.join(',') } : {};
+  const response = await apiClient.get('/products/my-products', { params });
+  return response.data;
+};
+
+export const getMyProductSummaries = async () => {
+  const response = await apiClient.get('/products/my-products/summary');
   return response.data;
 };
 
-export const getMyProducts = async () => {
-  const response = await apiClient.get('/products/my-products');
+export const batchGetProducts = async (ids: string[], fields?: string[]) => {
+  const params = fields ? { fields: fields.join(',') } : {};
+  const response = await apiClient.post('/products:batchGet', { ids }, { params });
   return response.data;
 };
 
-export const updateProduct = async (productId: string, data: any) => {
-  const response = await apiClient.patch(`/products/${productId}`, data);
+export const updateProduct = async (productId: string, data: any, idempotencyKey?: string) => {
+  const headers = idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {};
+  const response = await apiClient.patch(`/products/${productId}`, data, { headers });
   return response.data;
 };
 
@@ -52,8 +68,11 @@ export const deleteProduct = async (productId: string) => {
   return response.data;
 };
 
-export const getAllProducts = async (status?: string) => {
-  const params = status ? { status } : {};
+export const getAllProducts = async (status?: string, fields?: string[]) => {
+  const params = {
+    ...(status ? { status } : {}),
+    ...(fields ? { fields: fields.join(',') } : {}),
+  };
   const response = await apiClient.get('/admin/products', { params });
   return response.data;
 };
@@ -64,3 +83,15 @@ export const updateProductStatus = async (productId: string, status: string) =>
   });
   return response.data;
 };
+
+export const claimReviewQueue = async (n = 20) => {
+  const response = await apiClient.post('/admin/review-queue/claim', null, {
+    params: { n },
+  });
+  return response.data;
+};
+
+export const releaseReviewQueue = async () => {
+  const response = await apiClient.post('/admin/review-queue/release');
+  return response.data;
+};
@@ -4,3 +4,10 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs))
 }
+
+export function imageSrcSet(product: { image_variants?: Record<string, string> | null }) {
+  if (!product.image_variants) return undefined
+  return Object.entries(product.image_variants)
+    .map(([width, url]) => `${url} ${width}w`)
+    .join(", ")
+}
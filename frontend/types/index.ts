@@ -16,10 +16,26 @@ export interface Product {
   created_at: string;
   updated_at: string;
   is_deleted: boolean;
+  thumbnail_url?: string | null;
+  image_variants?: Record<string, string> | null;
+  image_hash?: string | null;
+  duplicate_of?: string[] | null;
+}
+
+export interface ProductSummary {
+  id: string;
+  title: string;
+  status: 'pending' | 'approved' | 'rejected';
+  thumbnail_url?: string | null;
+  created_at: string;
+  updated_at: string;
 }
 
 export interface AIGenerationResult {
   title: string;
   description: string;
   keywords?: string[];
+  degraded?: boolean;
+  image_hash?: string | null;
+  reused_from?: string | null;
 }
@@ -53,6 +53,8 @@ if __name__ == "__main__":
         print("Usage: python make_admin.py <your_email@example.com>")
         print("\nExample:")
         print("  python make_admin.py john@example.com")
+        print("\nFor many users at once:")
+        print("  python backend/scripts/bulk_admin_claims.py users.csv [--dry-run]")
         sys.exit(1)
     
     email = sys.argv[1]